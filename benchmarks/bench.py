@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+bench
+-----
+
+Benchmarks of complexity_determinant's own hot paths.
+
+    python -m benchmarks.bench [--save results.json] [--compare results.json]
+
+Every benchmark reports the best time of one operation. Results saved
+by --save can be compared with a later run by --compare, a benchmark
+slower than threshold times the stored result is flagged as a regression
+and the run fails. Timings are comparable only on the machine which saved
+them, results of another machine only warn about slowdowns: run
+"make bench-save" on every machine first. benchmarks/results.json is the
+committed baseline, missing stored results fail the run too.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import sys
+import tempfile
+import timeit
+
+import numpy as np
+
+import complexity_determinant
+from complexity_determinant import cache, complexity, logger, sampling
+from complexity_determinant.approximation import Approximation
+
+BENCHMARKS = []
+
+
+def benchmark(name):
+    """Registers benchmark, a function returning seconds per operation"""
+    def decorator(function):
+        BENCHMARKS.append((name, function))
+        return function
+    return decorator
+
+
+def best(function, number, repeat=5):
+    """Returns the best time of one function call"""
+    return min(timeit.repeat(function, number=number, repeat=repeat))/number
+
+
+def measurements(count, seed=0):
+    """Returns reproducible noisy quadratic measurements"""
+    random = np.random.RandomState(seed)
+    sizes = np.linspace(1e3, 5e6, count)
+    times = 1e-3 + 2e-14*sizes*sizes + random.normal(0, 1e-4, count)
+    return list(zip(sizes, times))
+
+
+def register_approximation_benchmarks():
+    """Approximation fitting and evaluation from 10^2 to 10^6 points"""
+    base = complexity.ComplexityLevel.N2.base
+    for exponent in range(2, 7):
+        count = 10**exponent
+        number = max(10**(5 - exponent), 1)
+        data = measurements(count)
+        sizes = np.array([size for size, _ in data])
+
+        @benchmark('approximation_fit_1e{}'.format(exponent))
+        def fit(data=data, number=number):
+            return best(lambda: Approximation(base, data), number)
+
+        @benchmark('approximation_eval_1e{}'.format(exponent))
+        def evaluate(data=data, sizes=sizes, number=number):
+            approximation = Approximation(base, data)
+            return best(lambda: approximation(sizes), number)
+
+
+register_approximation_benchmarks()
+
+
+@benchmark('best_complexity_1e3')
+def best_complexity():
+    data = measurements(1000)
+    return best(lambda: complexity.best_complexity(data), 20)
+
+
+@benchmark('best_complexity_1e5')
+def best_complexity_large():
+    data = measurements(100000)
+    return best(lambda: complexity.best_complexity(data), 2)
+
+
+@benchmark('max_problem_size_for_time')
+def max_problem_size_for_time():
+    chosen = complexity.best_complexity(measurements(1000))
+    return best(lambda: chosen.max_problem_size_for_time(10), 100)
+
+
+@benchmark('max_problem_size_for_time_1e4')
+def max_problem_size_for_times():
+    chosen = complexity.best_complexity(measurements(1000))
+    times = np.linspace(1, 100, 10000)
+    return best(lambda: chosen.max_problem_size_for_time(times), 20)
+
+
+def register_logger_benchmarks():
+    """Logger.log throughput in every output mode"""
+    for output in logger.LoggingOutput:
+        @benchmark('logger_{}'.format(output.name.lower()))
+        def log(output=output):
+            with tempfile.TemporaryDirectory() as directory, \
+                    open(os.devnull, 'w') as devnull, \
+                    contextlib.redirect_stdout(devnull), \
+                    contextlib.redirect_stderr(devnull):
+                logger.Logger.logging_output = output
+                logger.Logger.logging_file = os.path.join(directory, 'log')
+                try:
+                    return best(lambda: logger.Logger.log('message'), 1000)
+                finally:
+                    logger.Logger.logging_output = logger.LoggingOutput.NONE
+                    logger.Logger.close()
+
+
+register_logger_benchmarks()
+
+
+@benchmark('determine_per_measurement')
+def determine_overhead():
+    count = 1000
+    structure = {size: size for size in range(1, count + 1)}
+    # Calls measured alone, autoranging would time the loops instead
+    single = sampling.Sampling(min_time=None)
+    return best(lambda: complexity.determine(
+        structure, lambda problem: None, lambda: None, sampling=single),
+        1, 3)/count
+
+
+def run(selected=None):
+    """Runs benchmarks with names containing selected, returns results"""
+    logger.Logger.logging_output = logger.LoggingOutput.NONE
+    results = {}
+    for name, function in BENCHMARKS:
+        if selected is None or selected in name:
+            results[name] = function()
+            print('{:32} {:.3e}s'.format(name, results[name]))
+    return results
+
+
+def compare(results, stored, threshold):
+    """
+        Prints and returns names of benchmarks which regressed. Results
+        stored by a different machine only print the slowdowns
+    """
+    foreign = stored['fingerprint'] != cache.fingerprint()
+    if foreign:
+        print('Stored results come from a different machine, slowdowns '
+              'are not regressions, save results on this machine first')
+    regressions = []
+    for name, seconds in sorted(results.items()):
+        previous = stored['results'].get(name)
+        if previous is None:
+            continue
+        ratio = seconds/previous
+        if ratio > threshold:
+            print('{} {:32} {:.2f}x slower than {}'.format(
+                'SLOWER' if foreign else 'REGRESSION', name, ratio,
+                stored['version']))
+            if not foreign:
+                regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-k', help='Runs benchmarks containing this text')
+    parser.add_argument('--save', help='Stores results in this file')
+    parser.add_argument('--compare', help='Compares with stored results')
+    parser.add_argument('--threshold', type=float, default=1.5,
+                        help='Slowdown ratio flagged as a regression')
+    args = parser.parse_args()
+
+    if args.compare is not None and not os.path.exists(args.compare):
+        print('No stored results in {}, run with --save first'.format(
+            args.compare), file=sys.stderr)
+        return 2
+
+    results = run(args.k)
+    regressions = []
+    if args.compare is not None:
+        with open(args.compare) as stored:
+            regressions = compare(results, json.load(stored), args.threshold)
+    if args.save is not None:
+        with open(args.save, 'w') as stored:
+            json.dump({
+                'version': complexity_determinant.__version__,
+                'python': sys.version,
+                'fingerprint': cache.fingerprint(),
+                'results': results,
+            }, stored, indent=2, sort_keys=True)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
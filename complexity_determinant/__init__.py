@@ -2,8 +2,22 @@ __author__ = """Jakub Ptak"""
 __email__ = 'solpatium003@gmail.com'
 __version__ = '0.1'
 __all__ = ['approximation',
+           'asynchronous',
+           'batch',
+           'cache',
+           'compare',
            'complexity',
+           'events',
+           'fitting',
            'files_importer',
            'logger',
+           'measurement',
+           'memory',
+           'parallel',
+           'problems',
+           'robust',
+           'sampling',
+           'schedule',
+           'store',
            'timeout',
            'timer']
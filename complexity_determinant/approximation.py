@@ -1,63 +1,389 @@
-from numpy import array, dot, transpose
-from numpy.linalg import inv
+"""Least squares approximation of measured execution times"""
+from numpy import (asarray, broadcast_to, column_stack, diag, errstate,
+                   finfo, float64, full, inf, isfinite, log, median, nan,
+                   ones, outer, sqrt)
+from numpy.linalg import lstsq, pinv
+from .robust import Loss, OUTLIER
+
+
+def solve_normal_equations(gram, moments, squares, count):
+    """
+        Returns (factors, mean squared error) of least squares solution
+        given by accumulated A'A, A'y, y'y and count of measurements.
+        The system is scaled to unit diagonal before solving
+    """
+    with errstate(invalid='ignore'):
+        scale = sqrt(diag(gram))
+    scale[~(scale > 0)] = 1
+    scaled_gram = gram/outer(scale, scale)
+    scaled_moments = moments/scale
+    solution = lstsq(scaled_gram, scaled_moments, rcond=None)[0]
+
+    # ||y - Ab||^2 = y'y - 2b'A'y + b'A'Ab
+    squared_error = (squares
+                     - 2*solution.dot(scaled_moments)
+                     + solution.dot(scaled_gram).dot(solution))
+    return solution/scale, max(float(squared_error), 0)/max(count, 1)
+
+
+def evaluate(f, sizes):
+    """
+        Evaluates base function f over vector of sizes, or over matrix
+        of sizes of several variables, a row per size and a column
+        (argument of f) per variable
+    """
+    if sizes.ndim == 2:
+        return broadcast_to(f(*sizes.T), sizes.shape[:1])
+    return broadcast_to(f(sizes), sizes.shape)
 
 
 class Approximation:
     """Object containing informations about the complexity"""
-    def __init__(self, base, measurements):
-        self.measurements = measurements
+    def __init__(self, base, measurements, factors=None,
+                 mean_squared_error=None, weights=None, loss=None,
+                 residuals=None, leverages=None):
+        """
+            factors, mean_squared_error, residuals and leverages may be
+            passed when they were already solved elsewhere, e.g. by Fitting.
+            weights - weight of every measurement for weighted least
+                      squares, inverse of its variance up to a constant
+            loss - Loss of robust fitting by iteratively reweighted least
+                   squares, measurements far from the approximation get
+                   robust_weights lower than 1
+        """
+        self.measurements = list(measurements)
         self.base = base
-        self.factors = self.__calculate_factors()
-
-    def __calculate_factors(self):
-        """Wraps __factors_vector for easy usage"""
-        multiplier = []
-        values = []
-        # Fill multiplier and values
-        for x, y in self.measurements:
-            row = []
-            values.append([y])  # [[1],[2],[3]] (1xN)
-            for f in self.base:
-                row.append(f(x))
-            multiplier.append(row)
-
-        # Transform lists to arrays
-        multiplier = array(multiplier)
-        values = array(values)
-
-        # Calculate factors
-        return self.__factors_vector(multiplier, values)
+        self.weights = None if weights is None else list(weights)
+        self.loss = loss
+        self.robust_weights = None
+        self.__split = None
+        self.__scale = None
+        self.__mean_squared_error = mean_squared_error
+        if loss is not None:
+            factors = self.__fit_robust()
+        elif factors is None:
+            root = sqrt(self.weight_vector)
+            factors = self.factors_vector(
+                self.design_matrix(self.sizes)*root[:, None],
+                self.times*root)
+        self.factors = factors
+        self.__residuals = residuals
+        self.__leverages = leverages
+        # A'A, A'y, y'y of measurements, built on the first update
+        self.__accumulators = None
+        # Positions of measurements {(size, time): {indexes}}, built
+        # on the first removal
+        self.__positions = None
+
+    @staticmethod
+    def split(measurements):
+        """
+            Splits (size, time) pairs into sizes and times vectors, tuple
+            sizes of several variables into a matrix with a row per size
+        """
+        if len(measurements) and isinstance(measurements[0][0], tuple):
+            return (asarray([size for size, _ in measurements],
+                            dtype=float64),
+                    asarray([time for _, time in measurements],
+                            dtype=float64))
+        data = asarray(measurements, dtype=float64).reshape(-1, 2)
+        return data[:, 0], data[:, 1]
+
+    @property
+    def sizes(self):
+        """Returns vector of measured sizes"""
+        if self.__split is None:
+            self.__split = self.split(self.measurements)
+        return self.__split[0]
+
+    @property
+    def times(self):
+        """Returns vector of measured times"""
+        if self.__split is None:
+            self.__split = self.split(self.measurements)
+        return self.__split[1]
+
+    @property
+    def variables(self):
+        """Returns number of variables of measured sizes"""
+        sizes = self.sizes
+        return 1 if sizes.ndim == 1 else sizes.shape[1]
+
+    @property
+    def weight_vector(self):
+        """
+            Returns vector of weights used by the fit, weights multiplied
+            by robust_weights. Ones when unweighted
+        """
+        weights = self.__prior()
+        if self.robust_weights is not None:
+            weights = weights*self.robust_weights
+        return weights
+
+    def __prior(self):
+        """Returns vector of weights, ones when unweighted"""
+        if self.weights is None:
+            return ones(len(self.measurements))
+        return asarray(self.weights, dtype=float64)
+
+    def __fit_robust(self):
+        """
+            Returns factors of iteratively reweighted least squares, sets
+            robust_weights. Tukey's loss starts from the Huber's solution,
+            it may reject good measurements when started far from them
+        """
+        design = self.design_matrix(self.sizes)
+        times = self.times
+        self.robust_weights = ones(len(times))
+        if not isfinite(design).all():
+            # Base overflows for measured sizes, model is unusable
+            self.__mean_squared_error = inf
+            return full(len(self.base), nan)
+        prior = self.__prior()
+        root = sqrt(prior)
+
+        def solve(weights):
+            """Returns factors of weighted least squares"""
+            root = sqrt(weights)
+            return self.factors_vector(design*root[:, None], times*root)
+
+        factors = solve(prior)
+        # Exact fits of most measurements mustn't divide by zero
+        smallest = max(abs(times).max(initial=0)*1e-12, finfo(float64).tiny)
+        losses = [Loss.HUBER] if self.loss is Loss.HUBER else list(Loss)
+        for loss in losses:
+            for _ in range(50):
+                residuals = root*(times - design.dot(factors))
+                # Median absolute deviation estimates normal deviation
+                self.__scale = max(1.4826*median(abs(residuals)), smallest)
+                self.robust_weights = loss.weights(residuals/self.__scale)
+                previous, factors = factors, solve(prior*self.robust_weights)
+                change = abs(factors - previous).max()
+                if not change > 1e-8*abs(factors).max():
+                    break
+        return factors
+
+    def __refit_robust(self):
+        """Fits robustly again after measurements changed"""
+        self.__split = None
+        self.__mean_squared_error = None
+        self.robust_weights = None
+        self.factors = self.__fit_robust()
+        self.__residuals = None
+        self.__leverages = None
+
+    @property
+    def outliers(self):
+        """
+            Returns measurements farther from the robust approximation
+            than OUTLIER scales of residuals, empty when not robust
+        """
+        if self.__scale is None:
+            return []
+        standardized = sqrt(self.__prior())*self.residuals/self.__scale
+        return [measurement for measurement, residual
+                in zip(self.measurements, standardized)
+                if abs(residual) > OUTLIER]
+
+    def design_matrix(self, sizes):
+        """
+            Evaluates every base function over the sizes vector (matrix
+            for several variables) at once, one column per base function
+        """
+        sizes = asarray(sizes, dtype=float64)
+        return column_stack([evaluate(f, sizes) for f in self.base])
 
     @staticmethod
-    def __factors_vector(A, b):
+    def factors_vector(A, b):
+        """
+            Calculates factors vector minimizing ||A x factors - b||
+            Columns are scaled to unit maximum before solving, otherwise
+            columns like x*x for big x make the system badly conditioned
+        """
+        scale = abs(A).max(axis=0)
+        scale[scale == 0] = 1
+        solution = lstsq(A / scale, b, rcond=None)[0]
+        return solution / scale
+
+    def append(self, size, time, weight=1.0):
         """
-            Calculates factors vector from given matrices
-            factors = (At*A)^(-1) x At x b
-            <=>
-            factors = Bi x At x b where
-                Bi = (At*A)^(-1)
+            Adds measurement and refits in O(k^2) for k base functions,
+            robust approximations are fitted again
         """
-        At = transpose(A)
-        B = dot(At, A)
-        Bi = inv(B)
-        return dot(dot(Bi, At), b)
+        if self.loss is None:
+            self.__accumulate()
+        if self.weights is None and weight != 1:
+            self.weights = [1.0]*len(self.measurements)
+        self.measurements.append((size, time))
+        if self.weights is not None:
+            self.weights.append(weight)
+        if self.__positions is not None:
+            self.__positions.setdefault((size, time), set()).add(
+                len(self.measurements) - 1)
+        if self.loss is not None:
+            self.__refit_robust()
+            return
+        self.__update(size, time, weight)
+
+    def remove(self, size, time):
+        """
+            Removes measurement and refits in O(k^2) for k base functions,
+            robust approximations are fitted again. The last measurement
+            takes place of the removed one
+        """
+        if self.loss is None:
+            self.__accumulate()
+        index = self.__take_position(size, time)
+        last = len(self.measurements) - 1
+        weight = 1.0
+        if self.weights is not None:
+            weight = self.weights[index]
+            self.weights[index] = self.weights[last]
+            self.weights.pop()
+        if index != last:
+            moved = self.measurements[last]
+            self.measurements[index] = moved
+            self.__positions[moved].remove(last)
+            self.__positions[moved].add(index)
+        self.measurements.pop()
+        if self.loss is not None:
+            self.__refit_robust()
+            return
+        self.__update(size, time, -weight)
+
+    def __take_position(self, size, time):
+        """Returns index of measurement, forgotten by the positions"""
+        if self.__positions is None:
+            self.__positions = {}
+            for index, measurement in enumerate(self.measurements):
+                self.__positions.setdefault(tuple(measurement),
+                                            set()).add(index)
+        indexes = self.__positions.get((size, time))
+        if not indexes:
+            raise ValueError("{} is not measured".format((size, time)))
+        index = indexes.pop()
+        if not indexes:
+            del self.__positions[(size, time)]
+        return index
+
+    def __accumulate(self):
+        """Builds accumulators from measurements, done once"""
+        if self.__accumulators is None:
+            weights = self.weight_vector
+            design = self.design_matrix(self.sizes)
+            self.__accumulators = [design.T.dot(design*weights[:, None]),
+                                   design.T.dot(self.times*weights),
+                                   self.times.dot(self.times*weights)]
+
+    def __update(self, size, time, weight):
+        """Adds (positive weight) or subtracts measurement and refits"""
+        row = self.design_matrix([size])[0]
+        gram, moments, squares = self.__accumulators
+        gram += weight*outer(row, row)
+        moments += weight*time*row
+        squares += weight*time*time
+        self.__accumulators[2] = squares
+
+        self.factors, self.__mean_squared_error = solve_normal_equations(
+            gram, moments, squares, len(self.measurements))
+        self.__residuals = None
+        self.__leverages = None
+        self.__split = None
 
     def __call__(self, x):
-        """Returns approximation value for given x"""
-        value = 0
-        for i in range(len(self.base)):
-            fun = self.base[i]
-            factor = self.factors[i][0]
-            value += factor*fun(x)
-        return value
+        """
+            Returns approximation value for given x or array of x.
+            The last axis of x holds variables of sizes of several ones,
+            e.g. x = (n, m)
+        """
+        x = asarray(x, dtype=float64)
+        variables = self.variables
+        if variables == 1:
+            shape = x.shape
+            values = self.design_matrix(x.ravel()).dot(self.factors)
+        else:
+            shape = x.shape[:-1]
+            values = self.design_matrix(
+                x.reshape(-1, variables)).dot(self.factors)
+        if not shape:
+            return float(values[0])
+        return values.reshape(shape)
+
+    @property
+    def residuals(self):
+        """Returns measured times minus approximated ones"""
+        if self.__residuals is None:
+            self.__residuals = self.times - self(self.sizes)
+        return self.__residuals
 
     @property
     def mean_squared_error(self):
         """
-            Returns mean squared error
+            Returns mean squared error, weighted by weights if given
             https://en.wikipedia.org/wiki/Mean_squared_error
         """
-        error = 0
-        for x, y in self.measurements:
-            error += (y-self(x))**2
-        return error/len(self.measurements)
+        if self.__mean_squared_error is None:
+            self.__mean_squared_error = float(
+                (self.weight_vector*self.residuals**2).mean())
+        return self.__mean_squared_error
+
+    @property
+    def leverages(self):
+        """
+            Returns diagonal of the hat matrix of weighted least squares,
+            influence of every measurement on its own approximated time
+        """
+        if self.__leverages is None:
+            design = self.design_matrix(self.sizes)
+            design = design*sqrt(self.weight_vector)[:, None]
+            scale = abs(design).max(axis=0)
+            scale[~(scale > 0)] = 1
+            design /= scale
+            # H = X (X'X)^+ X', only its diagonal is needed
+            inverse = pinv(design.T.dot(design), hermitian=True)
+            self.__leverages = (design.dot(inverse)*design).sum(axis=1)
+        return self.__leverages
+
+    @property
+    def leave_one_out_error(self):
+        """
+            Returns mean squared error of leave-one-out cross-validation,
+            every time predicted by approximation of the other ones.
+            Computed from leverages in closed form, without refitting
+            https://en.wikipedia.org/wiki/Projection_matrix
+        """
+        if not isfinite(self.factors).all():
+            return inf
+        leverages = self.leverages
+        if (leverages >= 1 - 1e-9).any():
+            # A measurement determines a factor alone
+            return inf
+        errors = self.residuals/(1 - leverages)
+        return float((self.weight_vector*errors**2).mean())
+
+    def __information(self, penalty):
+        """Returns information criterion with penalty per factor"""
+        count = len(self.measurements)
+        if not isfinite(self.factors).all():
+            return inf
+        with errstate(divide='ignore'):
+            fit = count*log(self.mean_squared_error)
+        return float(fit + penalty*len(self.factors))
+
+    @property
+    def akaike_information_criterion(self):
+        """
+            Returns AIC of the approximation with normal errors, up to
+            a constant
+            https://en.wikipedia.org/wiki/Akaike_information_criterion
+        """
+        return self.__information(2)
+
+    @property
+    def bayesian_information_criterion(self):
+        """
+            Returns BIC of the approximation with normal errors, up to
+            a constant
+            https://en.wikipedia.org/wiki/Bayesian_information_criterion
+        """
+        return self.__information(log(len(self.measurements)))
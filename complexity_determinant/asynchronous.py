@@ -0,0 +1,51 @@
+"""asyncio interface of complexity determination"""
+import asyncio
+from functools import partial
+from .complexity import determine, determine_from_files
+from .timeout import Deadline
+
+
+async def _offload(function, max_execution, limit, executor, *args,
+                   **options):
+    """
+        Runs determination function in executor, optionally holding
+        limit (asyncio.Semaphore). Cancelling the task stops measuring
+        like an exceeded max_execution and waits for the executor
+    """
+    async def run():
+        deadline = Deadline(max_execution)
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(executor, partial(
+            function, *args, deadline=deadline, **options))
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            deadline.expire()
+            # Don't leave measurement running in the background
+            await asyncio.wait([future])
+            raise
+
+    if limit is None:
+        return await run()
+    async with limit:
+        return await run()
+
+
+async def determine_async(structure, test, clean_function, max_execution=30,
+                          limit=None, executor=None, **options):
+    """
+        Asynchronous determine, measures in executor (the default one
+        if None). Determinations sharing limit (asyncio.Semaphore) run
+        at most limit's value at once. Cancelling the task (e.g. by
+        asyncio.wait_for) stops measuring. Other options are passed
+        to determine
+    """
+    return await _offload(determine, max_execution, limit, executor,
+                          structure, test, clean_function, **options)
+
+
+async def determine_from_files_async(structure, test, clean, timeout=30,
+                                     limit=None, executor=None, **options):
+    """Asynchronous determine_from_files, works like determine_async"""
+    return await _offload(determine_from_files, timeout, limit, executor,
+                          structure, test, clean, **options)
@@ -0,0 +1,149 @@
+"""Running many determinations with results as JSON lines"""
+import json
+import math
+import multiprocessing
+import shlex
+from time import perf_counter
+from .complexity import determine_from_files, fit_complexities
+from .events import Recorder
+
+# Keyword arguments of run_job in the worker process
+_options = None
+# Information if events of the worker process are sent to the parent
+_observed = False
+
+
+def read_manifest(lines):
+    """
+        Yields (data, test, clean) triples of file names from lines,
+        blank lines and # comments are skipped
+    """
+    for number, line in enumerate(lines, 1):
+        line = line.split('#', 1)[0].strip()
+        if not line:
+            continue
+        triple = shlex.split(line)
+        if len(triple) != 3:
+            raise ValueError(
+                "Line {} doesn't contain data, test and clean".format(number))
+        yield tuple(triple)
+
+
+def _number(value):
+    """Returns float usable in strict JSON, None instead of nan and inf"""
+    value = float(value)
+    return value if math.isfinite(value) else None
+
+
+def _size(size):
+    """Returns JSON friendly size, list of numbers for tuple sizes"""
+    if isinstance(size, tuple):
+        return [_number(value) for value in size]
+    return _number(size)
+
+
+def complexity_record(complexity):
+    """Returns JSON friendly description of fitted complexity"""
+    approximation = complexity.approximation
+    return {
+        'complexity': str(complexity.complexity_level),
+        'factors': [_number(factor) for factor in approximation.factors],
+        'mean_squared_error': _number(approximation.mean_squared_error),
+        'leave_one_out_error': _number(approximation.leave_one_out_error),
+        'aic': _number(approximation.akaike_information_criterion),
+        'bic': _number(approximation.bayesian_information_criterion),
+        'valid': bool(complexity.is_valid()),
+    }
+
+
+def run_job(job, timeout=30, **options):
+    """Returns JSON friendly record of determination of the job triple"""
+    data, test, clean = job
+    record = {'data': data, 'test': test, 'clean': clean, 'error': None}
+    started = perf_counter()
+    try:
+        chosen = determine_from_files(data, test, clean, timeout, **options)
+    except Exception as e:
+        chosen = None
+        record['error'] = '{}: {}'.format(type(e).__name__, e)
+    duration = perf_counter() - started
+
+    if chosen is None:
+        record['error'] = record['error'] or 'Determination failed'
+        record['diagnostics'] = {'duration': duration}
+        return record
+
+    measurements = chosen.approximation.measurements
+    samples = sorted(chosen.samples.items())
+    record.update({
+        'chosen': str(chosen.complexity_level),
+        'measurements': [[_size(size), _number(time)]
+                         for size, time in sorted(measurements)],
+        'samples': [[_size(size), [_number(time) for time in times]]
+                    for size, times in samples],
+        'candidates': [complexity_record(complexity)
+                       for complexity in fit_complexities(
+                           measurements, chosen.approximation.weights,
+                           chosen.approximation.loss)],
+        'outliers': [[_size(size), _number(time)]
+                     for size, time in chosen.outliers],
+        'diagnostics': {
+            'duration': duration,
+            'measured': sum(sum(times) for _, times in samples),
+            'sizes': len(samples),
+            'samples': sum(len(times) for _, times in samples),
+        },
+    })
+    if chosen.space is not None:
+        record['space'] = complexity_record(chosen.space)
+    return record
+
+
+def _initialize(options, observed):
+    """Prepares worker process"""
+    global _options, _observed
+    _options = options
+    _observed = observed
+
+
+def _run_job(job):
+    """
+        Runs job with options of the worker process, returns its record
+        and events recorded for the observer of the parent
+    """
+    recorder = Recorder() if _observed else None
+    record = run_job(job, observer=recorder, **_options)
+    return record, recorder.events if _observed else ()
+
+
+def run_batch(jobs, output, workers=None, timeout=30, observer=None,
+              **options):
+    """
+        Runs determinations of (data, test, clean) jobs in this process or
+        in a pool of workers processes, each serving many jobs so imports
+        and caches are shared. Writes JSON record of every job to output
+        as soon as it's done. Events of all jobs are sent to observer.
+        Options are passed to determine, hard_kill, workers and RSS space
+        measurement need a serial batch
+    """
+    options['timeout'] = timeout
+
+    def write(record):
+        output.write(json.dumps(record, allow_nan=False) + '\n')
+        output.flush()
+
+    if workers is None:
+        for job in jobs:
+            write(run_job(job, observer=observer, **options))
+        return
+
+    pool = multiprocessing.Pool(workers, _initialize,
+                                (options, observer is not None))
+    try:
+        for record, events in pool.imap_unordered(_run_job, jobs):
+            write(record)
+            for event in events:
+                observer.observe(event)
+    finally:
+        pool.terminate()
+        pool.join()
@@ -0,0 +1,160 @@
+"""Persistent cache of measured samples"""
+import hashlib
+import json
+import numbers
+import os
+import platform
+import sqlite3
+import threading
+import time
+import types
+from .sampling import Sampling
+
+
+def _canonical(constant):
+    """
+        Returns repr of code constant, sets are sorted so that it doesn't
+        depend on hash randomization
+    """
+    if isinstance(constant, frozenset):
+        return 'frozenset({})'.format(
+            sorted(_canonical(item) for item in constant))
+    if isinstance(constant, tuple):
+        return '({})'.format(', '.join(_canonical(item)
+                                       for item in constant))
+    return repr(constant)
+
+
+def function_key(function):
+    """
+        Returns hash of function's name and code. Changes of functions
+        it calls are not noticed
+    """
+    function = getattr(function, '__func__', function)
+    name = '{}.{}'.format(
+        getattr(function, '__module__', None),
+        getattr(function, '__qualname__', type(function).__qualname__))
+    digest = hashlib.sha256(name.encode())
+
+    def update(code):
+        """Hashes code object with nested ones"""
+        digest.update(code.co_code)
+        digest.update(repr(code.co_names).encode())
+        for constant in code.co_consts:
+            if isinstance(constant, types.CodeType):
+                update(constant)
+            else:
+                digest.update(_canonical(constant).encode())
+
+    code = getattr(function, '__code__', None)
+    if code is not None:
+        update(code)
+    return digest.hexdigest()
+
+
+def timing_key(sampling):
+    """
+        Returns description of how samples of sampling are timed, samples
+        timed differently aren't comparable
+    """
+    return '{} {} gc {}'.format(
+        sampling.clock, 'single' if sampling.min_time is None else 'loop',
+        'off' if sampling.disable_gc else 'on')
+
+
+def _plain(size):
+    """Returns size of built-in numbers, e.g. of numpy ones, for json"""
+    if isinstance(size, tuple):
+        return [_plain(value) for value in size]
+    if isinstance(size, numbers.Integral):
+        return int(size)
+    return float(size)
+
+
+def fingerprint():
+    """Returns hash describing the machine and the interpreter"""
+    description = [
+        platform.node(),
+        platform.machine(),
+        platform.processor(),
+        platform.platform(),
+        platform.python_implementation(),
+        platform.python_version(),
+        str(os.cpu_count()),
+    ]
+    return hashlib.sha256('\n'.join(description).encode()).hexdigest()
+
+
+class MeasurementCache:
+    """
+        sqlite cache of samples keyed by tested function's code, the way
+        samples are timed, problem size and fingerprint of the machine.
+        Entries unused for max_age
+        seconds are evicted, above max_entries the least recently used
+        ones are evicted
+    """
+    def __init__(self, path='.complexity_cache.sqlite', max_entries=100000,
+                 max_age=30*24*3600):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.fingerprint = fingerprint()
+        self.__lock = threading.Lock()
+        with self.__connect() as connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS samples ('
+                'function TEXT, fingerprint TEXT, size TEXT, samples TEXT, '
+                'used REAL, PRIMARY KEY (function, fingerprint, size))')
+
+    def __connect(self):
+        """Returns new connection, usable in the current thread only"""
+        return sqlite3.connect(self.path, timeout=30)
+
+    def __key(self, test, size, sampling):
+        if sampling is None:
+            sampling = Sampling()
+        function = '{} {}'.format(function_key(test), timing_key(sampling))
+        return function, self.fingerprint, json.dumps(_plain(size))
+
+    def get(self, test, size, sampling=None):
+        """
+            Returns cached samples of test for size timed like by sampling
+            or None
+        """
+        key = self.__key(test, size, sampling)
+        with self.__lock, self.__connect() as connection:
+            row = connection.execute(
+                'SELECT samples FROM samples WHERE '
+                'function = ? AND fingerprint = ? AND size = ?',
+                key).fetchone()
+            if row is None:
+                return None
+            connection.execute(
+                'UPDATE samples SET used = ? WHERE '
+                'function = ? AND fingerprint = ? AND size = ?',
+                (time.time(),) + key)
+        return json.loads(row[0])
+
+    def update(self, test, samples, sampling=None):
+        """
+            Stores samples {size: [times]} of test timed like by sampling
+            and evicts old entries
+        """
+        now = time.time()
+        rows = [self.__key(test, size, sampling) + (json.dumps(times), now)
+                for size, times in samples.items()]
+        with self.__lock, self.__connect() as connection:
+            connection.executemany(
+                'INSERT OR REPLACE INTO samples VALUES (?, ?, ?, ?, ?)',
+                rows)
+            connection.execute('DELETE FROM samples WHERE used < ?',
+                               (now - self.max_age,))
+            connection.execute(
+                'DELETE FROM samples WHERE rowid IN (SELECT rowid FROM '
+                'samples ORDER BY used DESC LIMIT -1 OFFSET ?)',
+                (self.max_entries,))
+
+    def clear(self):
+        """Removes all entries"""
+        with self.__lock, self.__connect() as connection:
+            connection.execute('DELETE FROM samples')
@@ -0,0 +1,220 @@
+"""Head-to-head determination of several implementations"""
+from .complexity import Criterion, best_complexity
+from .events import span
+from .files_importer import properties_from_files
+from .logger import Logger, LoggingLevel
+from .measurement import (TestedFunctionError, autorange, execute_function,
+                          exceeds_memory, summarize)
+from .problems import problems
+from .sampling import Sampling
+from .timeout import Deadline, TimeoutExceeded
+
+
+def measure_interleaved(structure, tests, sampling, samples,
+                        memory_limit=None, observer=None):
+    """
+        Stores samples of every test {name: test} of every problem in
+        samples {name: {size: [times]}}. Samples of one problem alternate
+        between tests, rotating their order every round, so a drift of
+        the machine affects all of them alike. Every test gets repeat
+        samples, adaptive precision of sampling isn't used
+    """
+    for size, problem in problems(structure, observer=observer):
+        if exceeds_memory(size, memory_limit):
+            return
+        with span(observer, 'measure', size) as measured:
+            remaining = dict(tests)
+            # Calls of each test in a loop of one sample
+            numbers = dict.fromkeys(tests, 1)
+            try:
+                if sampling.min_time is not None:
+                    for name, test in tests.items():
+                        numbers[name] = autorange(test, problem, sampling)[0]
+            except TestedFunctionError:
+                Logger.log("Raised exception for size {}.", LoggingLevel.ERR,
+                           size)
+                continue
+
+            order = list(tests)
+            rounds = sampling.warmup + sampling.repeat
+            for round in range(rounds):
+                for name in order:
+                    if name not in remaining:
+                        continue
+                    try:
+                        time = execute_function(
+                            tests[name], problem, sampling.clock,
+                            numbers[name], sampling.disable_gc)
+                    except TestedFunctionError:
+                        Logger.log("{} raised exception for size {}.",
+                                   LoggingLevel.ERR, name, size)
+                        del remaining[name]
+                        samples[name].pop(size, None)
+                        continue
+                    if round >= sampling.warmup:
+                        samples[name].setdefault(size, []).append(time)
+                order = order[1:] + order[:1]
+            measured.repeat = sampling.repeat
+        # Release lazily created problem before creating the next one
+        del problem
+
+
+def compare(structure, tests, clean_function, max_execution=30,
+            sampling=None, memory_limit=None, criterion=Criterion.LOO,
+            weights=None, loss=None, observer=None):
+    """
+        Measures tests on the same problems and returns Comparison.
+        tests - dict {name: tested function} or iterable of functions
+                named by their __name__
+        Other arguments work like in determine, max_execution limits
+        measuring of all tests together
+    """
+    if not hasattr(tests, 'items'):
+        tests = {test.__name__: test for test in tests}
+    if sampling is None:
+        sampling = Sampling()
+    samples = {name: {} for name in tests}
+    deadline = Deadline(max_execution)
+    with span(observer, 'determine'):
+        try:
+            with deadline:
+                measure_interleaved(structure, tests, sampling, samples,
+                                    memory_limit, observer)
+        except TimeoutExceeded:
+            Logger.log("Exceeded {}s for all problems", LoggingLevel.WARN,
+                       max_execution)
+
+        with span(observer, 'clean'):
+            clean_function()
+
+        complexities = {}
+        with span(observer, 'fit'):
+            for name, measured in samples.items():
+                measurements = summarize(measured, sampling)
+                chosen = best_complexity(
+                    measurements, criterion,
+                    None if weights is None else weights(measurements),
+                    loss)
+                if chosen is None:
+                    Logger.log("No complexity of {}", LoggingLevel.ERR,
+                               name)
+                    continue
+                chosen.samples = measured
+                complexities[name] = chosen
+    return Comparison(complexities)
+
+
+def compare_from_files(structure, tests, clean, timeout=30, **options):
+    """
+        Wrapper around compare, reads the structure, every tested function
+        of tests files and the clean function from files, tests are named
+        by their files. Options are passed to compare
+    """
+    imported = {}
+    with span(options.get('observer'), 'import'):
+        for test in tests:
+            properties = properties_from_files(structure, test, clean)
+            if properties is None:
+                Logger.log("Structure or functions don't exist",
+                           LoggingLevel.ERR)
+                return None
+            imported[test] = properties[1]
+    return compare(properties[0], imported, properties[2], timeout,
+                   **options)
+
+
+class Comparison:
+    """Complexities of compared implementations {name: Complexity}"""
+    def __init__(self, complexities):
+        self.complexities = complexities
+
+    def __sizes(self, minimum, maximum, points):
+        """
+            Returns grid of sizes between minimum and maximum, by default
+            the measured ones. Geometric for positive sizes
+        """
+        import numpy
+        measured = [complexity.approximation.sizes
+                    for complexity in self.complexities.values()]
+        if minimum is None:
+            minimum = min(sizes.min() for sizes in measured)
+        if maximum is None:
+            maximum = max(sizes.max() for sizes in measured)
+        if minimum > 0:
+            return numpy.geomspace(minimum, maximum, points)
+        return numpy.linspace(minimum, maximum, points)
+
+    def predictions(self, sizes):
+        """Returns matrix of execution times, a row per complexity"""
+        import numpy
+        return numpy.array([complexity.execution_time(sizes)
+                            for complexity in self.complexities.values()])
+
+    def __refine(self, first, second, low, high):
+        """
+            Returns sizes between low and high where predicted times of
+            complexities of indexes first and second are equal, found by
+            bisection of all the intervals at once. Their difference must
+            change sign in every interval
+        """
+        import numpy
+        rows = numpy.arange(len(low))
+        with numpy.errstate(over='ignore', invalid='ignore'):
+            below = self.predictions(low)
+            sign = below[first, rows] > below[second, rows]
+            for _ in range(100):
+                middle = (low + high)/2
+                times = self.predictions(middle)
+                same = (times[first, rows] > times[second, rows]) == sign
+                low = numpy.where(same, middle, low)
+                high = numpy.where(same, high, middle)
+        return (low + high)/2
+
+    def crossovers(self, first, second, minimum=None, maximum=None,
+                   points=10000):
+        """
+            Returns array of sizes where predicted execution times
+            of implementations named first and second are equal, searched
+            between minimum and maximum on a grid of points
+        """
+        import numpy
+        names = list(self.complexities)
+        first, second = names.index(first), names.index(second)
+        sizes = self.__sizes(minimum, maximum, points)
+        with numpy.errstate(over='ignore', invalid='ignore'):
+            times = self.predictions(sizes)
+        slower = times[first] > times[second]
+        changes = numpy.flatnonzero(slower[1:] != slower[:-1])
+        return self.__refine(numpy.full(len(changes), first),
+                             numpy.full(len(changes), second),
+                             sizes[changes], sizes[changes + 1])
+
+    def fastest(self, minimum=None, maximum=None, points=10000):
+        """
+            Returns list of (low, high, name) size ranges covering minimum
+            to maximum, name is the fastest implementation in the range
+        """
+        import numpy
+        names = list(self.complexities)
+        if not names:
+            return []
+        sizes = self.__sizes(minimum, maximum, points)
+        with numpy.errstate(over='ignore', invalid='ignore'):
+            times = self.predictions(sizes)
+        times[~numpy.isfinite(times)] = numpy.inf
+        winners = times.argmin(axis=0)
+        changes = numpy.flatnonzero(winners[1:] != winners[:-1])
+        bounds = self.__refine(winners[changes], winners[changes + 1],
+                               sizes[changes], sizes[changes + 1])
+        lows = numpy.concatenate(([sizes[0]], bounds))
+        highs = numpy.concatenate((bounds, [sizes[-1]]))
+        leaders = numpy.concatenate((winners[changes], [winners[-1]]))
+        return [(float(low), float(high), names[leader])
+                for low, high, leader in zip(lows, highs, leaders)]
+
+    def __str__(self):
+        lines = ['{}: {}'.format(name, complexity)
+                 for name, complexity in self.complexities.items()]
+        lines += ['Fastest for sizes {:g} - {:g}: {}'.format(*row)
+                  for row in self.fastest()]
+        return '\n'.join(lines)
@@ -1,50 +1,253 @@
-import math
 from enum import Enum
-from scipy.optimize import newton
-from .approximation import Approximation
+from time import perf_counter
 from .logger import Logger, LoggingLevel
-from .timeout import timeout, TimeoutExceeded
-from .timer import Timer
+from .timeout import Deadline, timeout, TimeoutExceeded
+from .sampling import Sampling
+from .schedule import geometric_sizes
+from .problems import problems
+from .measurement import (exceeds_memory, measure_memory, measure_problem,
+                          reaches, summarize)
+from .parallel import (measure_isolated, measure_memory_isolated,
+                       measure_parallel)
+from .memory import MemoryMeasure
 from .files_importer import properties_from_files
+from .events import span
 
 
-class ComplexityLevel(Enum):
-    """Available complexities"""
-    N = "O(n)"
-    NLOGN = "O(nlog(n))"
-    N2 = "O(n^2)"
+class ComplexityLevel:
+    """
+        Complexity class. Every registered class is considered
+        by best_complexity, user-defined ones included
+    """
+    __registered = {}
+
+    def __init__(self, name, value, base, inverse=None, variables=1):
+        self.name = name
+        self.value = value
+        self.base = list(base)
+        self.inverse = inverse
+        self.variables = variables
 
     def __str__(self):
         return self.value
 
-    @staticmethod
-    def bases():
-        """Returns bases for complexities"""
-        return {
-            ComplexityLevel.N: [
-                lambda x: 1,
-                lambda x: x,
-            ],
-            ComplexityLevel.N2: [
-                lambda x: 1,
-                # lambda x: x,
-                lambda x: x*x
-            ],
-            ComplexityLevel.NLOGN: [
-                lambda x: 1,
-                # lambda x: math.log(x),
-                # lambda x: x,
-                lambda x: x*math.log(x)
-            ]
-        }
+    def __repr__(self):
+        return '<ComplexityLevel.{}: {}>'.format(self.name, self.value)
+
+    @classmethod
+    def register(cls, name, value, base, inverse=None, variables=1):
+        """
+            Registers a complexity class, available as ComplexityLevel.name
+            base - vectorized functions of problem size, the constant one
+                   first and the most important one last
+            inverse - vectorized inverse of the most important function,
+                      used by max_problem_size_for_time
+            variables - number of variables of problem sizes, base
+                        functions of several variables take one argument
+                        per variable and sizes of problems are tuples
+        """
+        if hasattr(cls, name) and name not in cls.__registered:
+            raise ValueError("Name {} is reserved".format(name))
+        level = cls(name, value, base, inverse, variables)
+        cls.__registered[name] = level
+        setattr(cls, name, level)
+        return level
+
+    @classmethod
+    def unregister(cls, name):
+        """Removes registered complexity class"""
+        del cls.__registered[name]
+        delattr(cls, name)
+
+    @classmethod
+    def registered(cls):
+        """Returns all registered complexity classes"""
+        return list(cls.__registered.values())
+
+    @classmethod
+    def bases(cls, variables=1):
+        """Returns bases for complexities of given number of variables"""
+        return {level: level.base for level in cls.registered()
+                if level.variables == variables}
+
+
+def _numpy():
+    """
+        Returns numpy, imported on the first fit instead of the package
+        import, so the command line starts fast
+    """
+    import numpy
+    return numpy
+
+
+# Base functions, shared between complexities so that Fitting evaluates
+# each of them only once
+def constant(x, *others):
+    return _numpy().ones_like(x)
+
+
+def logarithmic(x):
+    return _numpy().log(x)
+
+
+def linear(x):
+    return x
+
+
+def linearithmic(x):
+    return x*_numpy().log(x)
+
+
+def quadratic(x):
+    return x*x
+
+
+def cubic(x):
+    return x*x*x
+
+
+def exponential(x):
+    return _numpy().exp2(x)
+
+
+# Base functions of two variables (n, m)
+def first_linear(n, m):
+    return n
+
+
+def second_linear(n, m):
+    return m
+
+
+def bilinear(n, m):
+    return n*m
+
+
+def linear_logarithmic(n, m):
+    return n*_numpy().log(m)
+
+
+# Inverses of the most important base functions
+def natural_exponential(x):
+    return _numpy().exp(x)
+
+
+def square_root(x):
+    return _numpy().sqrt(x)
+
+
+def cube_root(x):
+    return _numpy().cbrt(x)
+
+
+def binary_logarithm(x):
+    return _numpy().log2(x)
+
+
+def lambert_exponential(x):
+    """Solves n*log(n) = x, n = exp(W(x)) with the Lambert W function"""
+    from scipy.special import lambertw
+    numpy = _numpy()
+    w = lambertw(x)
+    return numpy.where(w.imag == 0, numpy.exp(w.real), numpy.nan)
+
+
+ComplexityLevel.register('O1', 'O(1)', [constant])
+ComplexityLevel.register('LOGN', 'O(log(n))', [constant, logarithmic],
+                         natural_exponential)
+ComplexityLevel.register('N', 'O(n)', [constant, linear], linear)
+ComplexityLevel.register('NLOGN', 'O(nlog(n))', [constant, linearithmic],
+                         lambert_exponential)
+ComplexityLevel.register('N2', 'O(n^2)', [constant, quadratic],
+                         square_root)
+ComplexityLevel.register('N3', 'O(n^3)', [constant, cubic], cube_root)
+ComplexityLevel.register('EXP', 'O(2^n)', [constant, exponential],
+                         binary_logarithm)
+ComplexityLevel.register('NPLUSM', 'O(n+m)',
+                         [constant, first_linear, second_linear],
+                         variables=2)
+ComplexityLevel.register('NM', 'O(nm)', [constant, bilinear], variables=2)
+ComplexityLevel.register('NLOGM', 'O(nlog(m))', [constant, linear_logarithmic],
+                         variables=2)
+
+
+class Criterion(Enum):
+    """Criteria comparing approximations, lower is better"""
+    MSE = "mse"
+    LOO = "loo"
+    AIC = "aic"
+    BIC = "bic"
+
+    def __str__(self):
+        return self.value
+
+    def __call__(self, approximation):
+        """Returns score of approximation"""
+        if self is Criterion.MSE:
+            return approximation.mean_squared_error
+        if self is Criterion.LOO:
+            return approximation.leave_one_out_error
+        if self is Criterion.AIC:
+            return approximation.akaike_information_criterion
+        return approximation.bayesian_information_criterion
+
+
+def relative_weights(measurements):
+    """
+        Returns weights of (size, time) measurements for variance growing
+        with the square of time, i.e. with problem size. Times below
+        timer resolution count as the resolution
+    """
+    return [1/max(time, 1e-9)**2 for _, time in measurements]
+
+
+def variables(measurements):
+    """Returns number of variables of measured sizes, tuples have several"""
+    if len(measurements) and isinstance(measurements[0][0], tuple):
+        return len(measurements[0][0])
+    return 1
 
 
 class Complexity:
     """Object containing informations about the complexity"""
-    def __init__(self, complexity_level, measurements):
+    def __init__(self, complexity_level, measurements, approximation=None):
         self.complexity_level = complexity_level
-        base = ComplexityLevel.bases()[complexity_level]
-        self.approximation = Approximation(base, measurements)
+        if approximation is None:
+            from .approximation import Approximation
+            approximation = Approximation(complexity_level.base, measurements)
+        self.approximation = approximation
+        # Raw samples {size: [times]}, filled by determine
+        self.samples = {}
+        # Space complexity, filled by determine when measuring memory
+        self.space = None
+        # Pauses of garbage collections while measuring {size: seconds},
+        # filled by determine
+        self.gc_pauses = {}
+
+    def append(self, size, time, weight=1.0):
+        """
+            Adds measurement, refitting the approximation incrementally.
+            weight must be given like the weights of the fit, e.g. by
+            relative_weights([(size, time)])[0]
+        """
+        self.approximation.append(size, time, weight)
+
+    def remove(self, size, time):
+        """Removes measurement, refitting the approximation incrementally"""
+        self.approximation.remove(size, time)
+
+    @property
+    def weights(self):
+        """
+            Returns weights of measurements used by the approximation,
+            robust fits weigh down outliers
+        """
+        return self.approximation.weight_vector
+
+    @property
+    def outliers(self):
+        """Returns measurements rejected as outliers by robust fitting"""
+        return self.approximation.outliers
 
     def complexity_info(self):
         """Returns most basic info about the complexity"""
@@ -54,32 +257,154 @@ class Complexity:
         """Returns estimated execution time for problem of given size"""
         return self.approximation(problem_size)
 
-    def max_problem_size_for_time(self, time):
-        """Returns max problem size for given time"""
-        return newton(lambda x: self.approximation(x)-time, 5, maxiter=200)
+    def max_problem_size_for_time(self, time, fixed=None):
+        """
+            Returns max problem size for given time or array of sizes for
+            array of times. 0 if even the smallest problem takes longer,
+            inf if problems of every size fit.
+            fixed - for complexities of several variables, tuple of sizes
+                    of the variables held fixed with None at the one
+                    solved for, e.g. (None, 1000) for the max n if m = 1000
+        """
+        numpy = _numpy()
+        times = numpy.asarray(time, dtype=numpy.float64)
+        approximation = self.approximation
+        inverse = self.complexity_level.inverse
+        if approximation.variables > 1:
+            axis, along = self.__along(fixed)
+            sizes = self.__bisect(times.ravel(), along,
+                                  approximation.sizes[:, axis])
+        elif fixed is not None:
+            raise ValueError("Complexity of one variable has nothing fixed")
+        elif inverse is not None and len(approximation.factors) == 2:
+            sizes = self.__invert(inverse, times.ravel())
+        else:
+            sizes = self.__bisect(times.ravel(), approximation,
+                                  approximation.sizes)
+        if times.ndim == 0:
+            return float(sizes[0])
+        return sizes.reshape(times.shape)
+
+    def __invert(self, inverse, times):
+        """Returns sizes from the inverse of the most important function"""
+        numpy = _numpy()
+        constant, key = self.approximation.factors
+        if key <= 0:
+            # Time doesn't grow with size
+            return numpy.where(times >= constant, numpy.inf, 0.0)
+        # time = a + b*f(x) <=> x = f^(-1)((time - a)/b), outside of
+        # the domain of the inverse the time is shorter than any problem.
+        # Like in __bisect the smallest problem has size 1 unless smaller
+        # ones were measured, below it e.g. log(x) < 0 is still invertible
+        lowest = min(1.0, float(self.approximation.sizes.min()))
+        with numpy.errstate(divide='ignore', invalid='ignore',
+                            over='ignore'):
+            arguments = (times - constant)/key
+            sizes = numpy.asarray(inverse(arguments), dtype=numpy.float64)
+            shortest = self.approximation.base[-1](numpy.float64(lowest))
+        return numpy.where((sizes >= 0) & ~(arguments < shortest), sizes,
+                           0.0)
+
+    def __along(self, fixed):
+        """
+            Returns (axis, approximation as a function of sizes along it)
+            for complexities of several variables, the other variables
+            have sizes given by fixed
+        """
+        numpy = _numpy()
+        variables = self.approximation.variables
+        if (fixed is None or len(fixed) != variables or
+                [size is None for size in fixed].count(True) != 1):
+            raise ValueError("Sizes of {} variables but the solved one "
+                             "must be fixed".format(variables))
+        axis = [size is None for size in fixed].index(True)
+        point = numpy.array([0.0 if size is None else size
+                             for size in fixed], dtype=numpy.float64)
+
+        def along(sizes):
+            """Returns approximated times of sizes along the axis"""
+            points = numpy.tile(point, (sizes.size, 1))
+            points[:, axis] = sizes.ravel()
+            return self.approximation(points).reshape(sizes.shape)
+        return axis, along
+
+    def __bisect(self, times, approximation, measured):
+        """
+            Returns sizes by bisection of sizes bracketing each time,
+            for classes without inverse. Assumes the time grows with size.
+            approximation - function of sizes, measured - measured sizes
+        """
+        numpy = _numpy()
+        lowest = min(1.0, float(measured.min()))
+        low = numpy.full(times.shape, lowest)
+        high = numpy.full(times.shape, max(float(measured.max()), 2*lowest))
+        with numpy.errstate(invalid='ignore', over='ignore'):
+            too_long = approximation(low) > times
+            # Doubling stays finite for 1000 steps
+            for _ in range(1000):
+                short = approximation(high) < times
+                if not short.any():
+                    break
+                high[short] *= 2
+            unbounded = approximation(high) < times
+            for _ in range(200):
+                if (high <= low*(1 + 1e-12)).all():
+                    break
+                middle = numpy.where(low > 0, numpy.sqrt(low*high), high/2)
+                fits = approximation(middle) <= times
+                low = numpy.where(fits, middle, low)
+                high = numpy.where(fits, high, middle)
+        low[unbounded] = numpy.inf
+        low[too_long] = 0.0
+        return low
+
+    def memory_usage(self, problem_size):
+        """Returns estimated memory [B] for problem of given size"""
+        if self.space is None:
+            Logger.log("Memory wasn't measured", LoggingLevel.ERR)
+            return None
+        return self.space.execution_time(problem_size)
+
+    def max_problem_size_for_memory(self, memory, fixed=None):
+        """
+            Returns max problem size for given memory [B], fixed works
+            like in max_problem_size_for_time
+        """
+        if self.space is None:
+            Logger.log("Memory wasn't measured", LoggingLevel.ERR)
+            return None
+        return self.space.max_problem_size_for_time(memory, fixed)
 
     def is_valid(self):
         """
             Returns information if approximation is ok.
-            Quadratic and logarithmic functions might become a linear
+            Quadratic and logarithmic functions might become a constant
         """
-        if self.complexity_level == ComplexityLevel.N:
+        approximation = self.approximation
+        if len(approximation.base) == 1:
             # No distortion in this case
             return True
-        else:
-            epsilon = 10e-10
-            # If the most important factor is not significant
-            # there is something wrong
-            return self.approximation.factors[-1][-1] > epsilon
+        numpy = _numpy()
+        if not numpy.isfinite(approximation.factors).all():
+            return False
+        epsilon = 10e-10
+        # If the most important function is not significant for
+        # the biggest measured problem there is something wrong
+        biggest = numpy.atleast_1d(approximation.sizes.max(axis=0))
+        with numpy.errstate(over='ignore'):
+            biggest = approximation.base[-1](*biggest)
+        return approximation.factors[-1]*biggest > epsilon
 
     def __str__(self):
         # Get the most important factor
-        key_factor = self.approximation.factors[-1][-1]
+        key_factor = self.approximation.factors[-1]
         modifier = ''
-        if key_factor < 0.05:
-            modifier = ' better than'
-        if key_factor > 10:
-            modifier = ' worse than'
+        # Nothing is better or worse than a constant alone
+        if len(self.approximation.base) > 1:
+            if key_factor < 0.05:
+                modifier = ' better than'
+            if key_factor > 10:
+                modifier = ' worse than'
         return 'Complexity{} {}. Mean squared error={}'.format(
             modifier,
             self.complexity_level,
@@ -87,82 +412,329 @@ class Complexity:
         )
 
 
-def determine(structure, test, clean_function, max_execution=30):
-    """Measures execution times and returns complexity object"""
-    class TestedFunctionError(Exception):
-        """Exception thrown when tested function throws an exception"""
-        pass
+def determine(structure, test, clean_function, max_execution=30,
+              sampling=None, memory_limit=None, workers=None,
+              pin_workers=False, size_timeout=None, hard_kill=False,
+              deadline=None, cache=None, space=None,
+              criterion=Criterion.LOO, weights=None, loss=None,
+              observer=None):
+    """
+        Measures execution times and returns complexity object.
+        structure - dict {size: problem}, LazyStructure or iterable
+                    of (size, problem) pairs, e.g. a generator. Sizes
+                    may be tuples of several variables like (n, m),
+                    fitted by complexities of that many variables
+        sampling - Sampling describing how each problem is measured,
+                   raw samples are available as samples of the result,
+                   pauses of garbage collections as its gc_pauses
+        memory_limit - max resident memory [B], bigger problems
+                       are not measured
+        workers - measures problems in a pool of that many processes
+        pin_workers - pins every worker process to a separate core
+        size_timeout - max time of one problem [s], once a problem
+                       exceeds it bigger ones are skipped
+        hard_kill - measures every problem in its own process killed
+                    after size_timeout, even inside a call into C code.
+                    Not available with workers
+        deadline - Deadline for all problems used instead of max_execution,
+                   expiring it stops measuring from another thread
+        cache - MeasurementCache, only sizes missing in it are measured
+        space - MemoryMeasure, determines also space complexity of memory
+                used by measured problems, available as space of the result
+        criterion - Criterion selecting the best complexity
+        weights - function of measurements returning their weights,
+                  e.g. relative_weights, unweighted if None
+        loss - robust.Loss, fits robustly to resist outlying measurements,
+               e.g. ones disturbed by other processes
+        observer - events.Observer receiving events of every phase
+    """
+    with span(observer, 'determine'):
+        return _determine(
+            structure, test, clean_function, max_execution,
+            sampling=sampling, memory_limit=memory_limit, workers=workers,
+            pin_workers=pin_workers, size_timeout=size_timeout,
+            hard_kill=hard_kill, deadline=deadline, cache=cache, space=space,
+            criterion=criterion, weights=weights, loss=loss,
+            observer=observer)
 
-    def execute_function(problem):
-        """Executes tested function and returns execution time"""
-        try:
-            timer = Timer()
-            timer.start()
-            test(problem)
-            timer.stop()
-            return timer.time
-        except TimeoutExceeded as exceded:
-            # We might catch this exception accidently
-            raise exceded
-        except Exception as e:
-            Logger.log(str(e), LoggingLevel.ERR)
-            raise TestedFunctionError
 
-    @timeout(max_execution)
-    def measure_time(measurements):
+def _determine(structure, test, clean_function, max_execution, *, sampling,
+               memory_limit, workers, pin_workers, size_timeout, hard_kill,
+               deadline, cache, space, criterion, weights, loss, observer):
+    """Implementation of determine"""
+    if sampling is None:
+        sampling = Sampling()
+    if deadline is None:
+        deadline = Deadline(max_execution)
+    if hard_kill and workers is not None:
+        Logger.log("Hard kill is not available with workers",
+                   LoggingLevel.WARN)
+    measure = measure_isolated if hard_kill else measure_problem
+    measure_space = measure_memory
+    if space is MemoryMeasure.RSS:
+        measure_space = measure_memory_isolated
+
+    cached = {}
+
+    def uncached(size):
+        """Returns information if size is missing in cache"""
+        if cache is None:
+            return True
+        samples = cache.get(test, size, sampling)
+        if samples is None:
+            return True
+        cached[size] = samples
+        return False
+
+    def measure_time(samples):
         """Executes tested function for all problems"""
-        for size, problem in structure.items():
-            try:
-                measurements[size] = execute_function(problem)
-            except TestedFunctionError:
-                Logger.log("Raised exception for size {}.".format(size),
-                           LoggingLevel.ERR)
+        if workers is not None:
+            measure_parallel(structure, test, sampling, samples, workers,
+                             pin_workers, memory_limit, size_timeout,
+                             uncached, space, memory, observer, pauses)
+            return
+        # Sizes which exceeded size_timeout
+        overruns = []
+
+        def wanted(size):
+            """Returns information if size should be measured"""
+            return (not any(reaches(size, overrun) for overrun in overruns)
+                    and uncached(size))
+
+        for size, problem in problems(structure, wanted, observer):
+            if exceeds_memory(size, memory_limit):
+                return
+            with span(observer, 'measure', size) as measured:
+                if not measure(test, problem, sampling, size, samples,
+                               size_timeout, pauses):
+                    overruns.append(size)
+                measured.repeat = len(samples.get(size, ()))
+                measured.gc = pauses.get(size)
+            if space is not None and size in samples:
+                with span(observer, 'memory', size) as measured:
+                    usage = measure_space(test, problem, space)
+                    measured.memory = usage
+                if usage is not None:
+                    memory[size] = usage
+            # Release lazily created problem before creating the next one
+            del problem
 
     try:
-        measurements = {}
-        measure_time(measurements)
+        samples = {}
+        memory = {}
+        pauses = {}
+        with deadline:
+            measure_time(samples)
     except TimeoutExceeded:
-        message = "Exceeded {}s for all problems".format(max_execution)
-        Logger.log(message, LoggingLevel.WARN)
+        if deadline.seconds is None:
+            Logger.log("Stopped before all problems", LoggingLevel.WARN)
+        else:
+            Logger.log("Exceeded {}s for all problems", LoggingLevel.WARN,
+                       deadline.seconds)
 
-    clean_function()
+    with span(observer, 'clean'):
+        clean_function()
 
-    measurements = list(measurements.items())  # List of tuples
-    return best_complexity(measurements)
+    if cache is not None:
+        cache.update(test, samples, sampling)
+        samples.update(cached)
 
+    with span(observer, 'fit'):
+        chosen = _choose(summarize(samples, sampling), criterion, weights,
+                         loss)
+        if chosen is not None and space is not None:
+            chosen.space = best_complexity(list(memory.items()), criterion)
+    if chosen is not None:
+        chosen.samples = samples
+        chosen.gc_pauses = pauses
+    return chosen
+
+
+def determine_adaptive(factory, test, clean_function, minimum, maximum,
+                       max_execution=30, sampling=None, ratio=2,
+                       decisive=4, memory_limit=None, size_timeout=None,
+                       hard_kill=False, criterion=Criterion.LOO,
+                       weights=None, loss=None, observer=None):
+    """
+        Measures problems created by factory(size) for sizes growing
+        geometrically by ratio from minimum to maximum, refitting after
+        every measurement, and returns complexity object.
+        Stops early when one complexity clearly wins (its leave-one-out
+        error is decisive times lower than the runner-up's in two fits
+        in a row) or when the best complexity predicts that the next size
+        won't fit in the rest of max_execution or a problem exceeds
+        size_timeout. hard_kill, criterion, weights, loss and observer
+        work like in determine, every refit is a fit event of the next size
+    """
+    if sampling is None:
+        sampling = Sampling()
+    measure = measure_isolated if hard_kill else measure_problem
+    started = perf_counter()
+
+    def stop_reason(size, measurements, leaders):
+        """Returns why measuring should stop before size or None"""
+        with span(observer, 'fit', size):
+            ranking = rank_complexities(
+                measurements, Criterion.LOO,
+                None if weights is None else weights(measurements), loss)
+        if not ranking:
+            return None
+        leader = ranking[0]
+        clear = (len(ranking) == 1 or
+                 ranking[1].approximation.leave_one_out_error >=
+                 decisive*leader.approximation.leave_one_out_error)
+        leaders.append(leader.complexity_level if clear else None)
+        if clear and leaders[-2:] == [leader.complexity_level]*2:
+            return "{} clearly wins".format(leader.complexity_level)
+
+        runs = sampling.warmup + sampling.repeat
+        predicted = runs*leader.execution_time(size)
+        remaining = max_execution - (perf_counter() - started)
+        if predicted > remaining:
+            return "Size {} would take {}s, {}s left".format(
+                size, predicted, remaining)
+        return None
+
+    @timeout(max_execution)
+    def measure_time(samples):
+        """Executes tested function for scheduled problems"""
+        leaders = []
+        for size in geometric_sizes(minimum, maximum, ratio):
+            if len(samples) > 2:
+                reason = stop_reason(size, summarize(samples, sampling),
+                                     leaders)
+                if reason is not None:
+                    Logger.log(reason, LoggingLevel.DEBUG)
+                    return
+            with span(observer, 'setup', size):
+                problem = factory(size)
+            if exceeds_memory(size, memory_limit):
+                return
+            with span(observer, 'measure', size) as measured:
+                measured_in_time = measure(test, problem, sampling, size,
+                                           samples, size_timeout, pauses)
+                measured.repeat = len(samples.get(size, ()))
+                measured.gc = pauses.get(size)
+            if not measured_in_time:
+                return
+            del problem
 
-def determine_from_files(structure, test, clean, timeout=30):
-    """Wrapper around determine, reads all needed data from files"""
-    imported = properties_from_files(structure, test, clean)
+    pauses = {}
+    with span(observer, 'determine'):
+        try:
+            samples = {}
+            measure_time(samples)
+        except TimeoutExceeded:
+            Logger.log("Exceeded {}s for all problems", LoggingLevel.WARN,
+                       max_execution)
+
+        with span(observer, 'clean'):
+            clean_function()
+
+        with span(observer, 'fit'):
+            chosen = _choose(summarize(samples, sampling), criterion,
+                             weights, loss)
+    if chosen is not None:
+        chosen.samples = samples
+        chosen.gc_pauses = pauses
+    return chosen
+
+
+def determine_from_files(structure, test, clean, timeout=30, **options):
+    """
+        Wrapper around determine, reads all needed data from files.
+        Options are passed to determine
+    """
+    with span(options.get('observer'), 'import'):
+        imported = properties_from_files(structure, test, clean)
     if imported is None:
         Logger.log("Structure or functions don't exist", LoggingLevel.ERR)
         return None
-    return determine(imported[0], imported[1], imported[2], timeout)
+    return determine(imported[0], imported[1], imported[2], timeout,
+                     **options)
 
 
-def best_complexity(measurements):
-    """Returns the best complexity based on measurements"""
-    # Check measurements
-    if len(measurements) < 2:
-        Logger.log("At least 2 measurements are required", LoggingLevel.ERR)
-        return None
+def _choose(measurements, criterion=Criterion.LOO, weights=None,
+            loss=None):
+    """Returns the best complexity, weights is a function of measurements"""
+    if weights is not None:
+        weights = weights(measurements)
+    return best_complexity(measurements, criterion, weights, loss)
+
 
-    proposed = [
-        Complexity(ComplexityLevel.NLOGN, measurements),
-        Complexity(ComplexityLevel.N, measurements),
-        Complexity(ComplexityLevel.N2, measurements)
+def fit_complexities(measurements, weights=None, loss=None):
+    """
+        Returns complexities of all registered levels of as many
+        variables as measured sizes have, valid or not, fitted by least
+        squares weighted by weights if given. Robust fits with loss can't
+        share work, every level is fitted alone
+    """
+    from .approximation import Approximation
+    from .fitting import Fitting
+    bases = ComplexityLevel.bases(variables(measurements))
+    if not bases:
+        return []
+    if loss is not None:
+        return [
+            Complexity(level, measurements,
+                       Approximation(base, measurements, weights=weights,
+                                     loss=loss))
+            for level, base in bases.items()
+        ]
+    fitting = Fitting(measurements, bases.values(), weights)
+    return [
+        Complexity(level, measurements, fitting.approximation(base))
+        for level, base in bases.items()
     ]
 
+
+def rank_complexities(measurements, criterion=Criterion.LOO, weights=None,
+                      loss=None):
+    """
+        Returns valid complexities sorted from the best by criterion.
+        Leave-one-out error of complexities with as many factors as
+        measurements is undefined, they are ranked by MSE then
+    """
+    proposed = fit_complexities(measurements, weights, loss)
+
     def filter_invalid(complexity):
         """Leavs only valid complexities"""
         if not complexity.is_valid():
-            Logger.log('Invalid {}'.format(complexity), LoggingLevel.DEBUG)
+            Logger.log('Invalid {}', LoggingLevel.DEBUG, complexity)
             return False
         return True
 
     possible = [x for x in proposed if filter_invalid(x)]
-    chosen = min(possible, key=lambda x: x.approximation.mean_squared_error)
+    factors = max((len(x.approximation.factors) for x in possible),
+                  default=0)
+    if criterion is Criterion.LOO and len(measurements) <= factors:
+        Logger.log('Too few measurements for leave-one-out error',
+                   LoggingLevel.DEBUG)
+        criterion = Criterion.MSE
+    return sorted(possible, key=lambda x: criterion(x.approximation))
+
+
+def best_complexity(measurements, criterion=Criterion.LOO, weights=None,
+                    loss=None):
+    """
+        Returns the best complexity based on measurements.
+        criterion - Criterion comparing complexities, the default
+                    leave-one-out error doesn't favour overfitting ones
+                    like the in-sample mean squared error does
+        weights - weights of measurements for weighted least squares
+        loss - robust.Loss of robust fitting, least squares if None
+    """
+    # Check measurements
+    if len(measurements) < 2:
+        Logger.log("At least 2 measurements are required", LoggingLevel.ERR)
+        return None
+
+    possible = rank_complexities(measurements, criterion, weights, loss)
+    if not possible:
+        Logger.log("No valid complexity found", LoggingLevel.ERR)
+        return None
+    chosen = possible[0]
 
-    Logger.log('The best is {}'.format(chosen), LoggingLevel.DEBUG)
+    Logger.log('The best is {}', LoggingLevel.DEBUG, chosen)
 
     return chosen
@@ -0,0 +1,140 @@
+"""Events of determination phases for observers, e.g. trace exporters"""
+import json
+import os
+import threading
+from collections import namedtuple
+from time import perf_counter
+
+
+class Event(namedtuple('Event', ['phase', 'size', 'start', 'duration',
+                                 'repeat', 'memory', 'gc', 'process',
+                                 'thread'])):
+    """
+        Finished phase of determination.
+        phase - 'determine', 'import', 'setup', 'measure', 'memory',
+                'clean' or 'fit'
+        size - size of the problem, None for phases of all problems
+        start, duration - perf_counter time [s], comparable between
+                          processes of one machine
+        repeat - number of samples of measure, otherwise None
+        memory - memory [B] used by the problem in memory, otherwise None
+        gc - pause of garbage collections [s] in measure, otherwise None
+    """
+    __slots__ = ()
+
+    @property
+    def end(self):
+        """Returns perf_counter time when the phase finished"""
+        return self.start + self.duration
+
+
+class Observer:
+    """Receives events of determination, base of observers"""
+    def observe(self, event):
+        """Called once phase of the event is finished"""
+        pass
+
+
+class Recorder(Observer):
+    """Observer keeping all events in events, safe for threads"""
+    def __init__(self):
+        self.events = []
+        self.__lock = threading.Lock()
+
+    def observe(self, event):
+        with self.__lock:
+            self.events.append(event)
+
+
+class ChromeTrace(Recorder):
+    """
+        Recorder exporting events in Chrome trace-event format, viewable
+        in chrome://tracing or Perfetto
+    """
+    def trace_events(self):
+        """Returns list of complete trace events"""
+        traced = []
+        for event in self.events:
+            name = event.phase
+            if event.size is not None:
+                name = '{} {}'.format(event.phase, event.size)
+            arguments = {key: value for key, value in
+                         (('size', event.size), ('repeat', event.repeat),
+                          ('memory', event.memory), ('gc', event.gc))
+                         if value is not None}
+            traced.append({
+                'name': name,
+                'cat': event.phase,
+                'ph': 'X',
+                'ts': event.start*1e6,
+                'dur': event.duration*1e6,
+                'pid': event.process,
+                'tid': event.thread,
+                'args': arguments,
+            })
+        return traced
+
+    def write(self, output):
+        """Writes trace as JSON to file-like output"""
+        json.dump({'traceEvents': self.trace_events(),
+                   'displayTimeUnit': 'ms'}, output, default=str)
+
+    def save(self, path):
+        """Writes trace as JSON to file of given path"""
+        with open(path, 'w') as output:
+            self.write(output)
+
+
+class _Span:
+    """Context manager sending event of the phase it wraps to observer"""
+    __slots__ = ('observer', 'phase', 'size', 'start', 'repeat', 'memory',
+                 'gc')
+
+    def __init__(self, observer, phase, size):
+        self.observer = observer
+        self.phase = phase
+        self.size = size
+        self.repeat = None
+        self.memory = None
+        self.gc = None
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exception):
+        duration = perf_counter() - self.start
+        self.observer.observe(Event(
+            self.phase, self.size, self.start, duration, self.repeat,
+            self.memory, self.gc, os.getpid(), threading.get_ident()))
+        return False
+
+
+class _NoSpan:
+    """Shared context manager doing nothing when nobody observes"""
+    repeat = None
+    memory = None
+    gc = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(observer, phase, size=None):
+    """
+        Returns context manager reporting the phase to observer, repeat,
+        memory and gc of the event may be set inside. Costs a function call
+        without observer
+    """
+    if observer is None:
+        return _NO_SPAN
+    return _Span(observer, phase, size)
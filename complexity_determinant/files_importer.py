@@ -1,22 +1,30 @@
 import importlib
 from .logger import Logger, LoggingLevel
+from .store import ProblemStore, is_store
 
 
 def properties_from_files(structure_file, tested_file, clean_file):
-    """Returns tuple with values to be tested"""
+    """
+        Returns tuple with values to be tested. Structure file may also
+        be a directory with problems materialized by store.materialize
+    """
     def module_name(file_name):
         """Removes .py from file name"""
         return file_name.replace(".py", "")
 
     # Get modules' names
+    store = structure_file if is_store(structure_file) else None
     structure_file = module_name(structure_file)
     tested_file = module_name(tested_file)
     clean_file = module_name(clean_file)
 
     try:
         # Data structure
-        structure_module = importlib.import_module(structure_file)
-        structure = structure_module.data_structure
+        if store is not None:
+            structure = ProblemStore(store)
+        else:
+            structure_module = importlib.import_module(structure_file)
+            structure = structure_module.data_structure
 
         # Function or class function
         function_module = importlib.import_module(tested_file)
@@ -41,14 +49,13 @@ def properties_from_files(structure_file, tested_file, clean_file):
 
         return (structure, function, clean)
     except AttributeError as attribute:
-        Logger.log("Missing test property: {}".format(str(attribute)),
-                   LoggingLevel.ERR)
+        Logger.log("Missing test property: {}", LoggingLevel.ERR, attribute)
         return None
     except SyntaxError as syntax:
-        Logger.log("One files has an invalid syntax: {}".format(str(syntax)),
-                   LoggingLevel.ERR)
+        Logger.log("One files has an invalid syntax: {}", LoggingLevel.ERR,
+                   syntax)
         return None
     except ModuleNotFoundError as not_found:
-        Logger.log("One of files doesn't exist: {}".format(str(not_found)),
-                   LoggingLevel.ERR)
+        Logger.log("One of files doesn't exist: {}", LoggingLevel.ERR,
+                   not_found)
         return None
@@ -0,0 +1,91 @@
+"""Fitting engine sharing work between candidate approximations"""
+from numpy import (asarray, column_stack, errstate, float64, full, inf,
+                   isfinite, ix_, nan, sqrt)
+from numpy.linalg import pinv
+from .approximation import Approximation, evaluate, solve_normal_equations
+
+
+class Fitting:
+    """
+        Fits many bases against the same measurements, weighted by
+        weights of measurements if given.
+        Every distinct base function is evaluated over the measurements
+        once, the Gram matrix of all evaluated columns is built in a single
+        pass over the data and each model is solved from its sub-block.
+        Residuals and leverages of models come from the same columns.
+        Solved approximations (with their errors) are memoized.
+    """
+    def __init__(self, measurements, bases, weights=None):
+        self.measurements = measurements
+        self.weights = weights
+        self.sizes, self.times = Approximation.split(measurements)
+        self.__approximations = {}
+
+        # Column index of every distinct base function
+        self.__columns = {}
+        for base in bases:
+            for f in base:
+                self.__columns.setdefault(f, len(self.__columns))
+
+        matrix = self.__evaluate()
+        self.__finite = isfinite(matrix).all(axis=0)
+        matrix[:, ~self.__finite] = 0
+
+        # Scaled columns keep the Gram matrix reasonably conditioned
+        self.__scale = abs(matrix).max(axis=0)
+        self.__scale[self.__scale == 0] = 1
+        matrix /= self.__scale
+        self.__matrix = matrix
+
+        # Weighted least squares of rows and times scaled by sqrt(weight)
+        times = self.times
+        self.__root = None
+        if weights is not None:
+            self.__root = sqrt(asarray(weights, dtype=float64))
+            matrix = matrix*self.__root[:, None]
+            times = times*self.__root
+
+        self.__gram = matrix.T.dot(matrix)
+        self.__moments = matrix.T.dot(times)
+        self.__squares = times.dot(times)
+
+    def __evaluate(self):
+        """Returns matrix with one column per distinct base function"""
+        functions = sorted(self.__columns, key=self.__columns.get)
+        with errstate(over='ignore', invalid='ignore', divide='ignore'):
+            matrix = column_stack([evaluate(f, self.sizes)
+                                   for f in functions])
+        return asarray(matrix, dtype=float64)
+
+    def approximation(self, base):
+        """Returns memoized Approximation of measurements for given base"""
+        key = tuple(base)
+        if key not in self.__approximations:
+            self.__approximations[key] = self.__solve(base)
+        return self.__approximations[key]
+
+    def __solve(self, base):
+        """
+            Solves one model from the shared Gram matrix, its residuals
+            and leverages from the shared evaluated columns
+        """
+        indexes = [self.__columns[f] for f in base]
+        if not self.__finite[indexes].all():
+            # Base overflows for measured sizes, model is unusable
+            return Approximation(base, self.measurements,
+                                 full(len(base), nan), inf, self.weights)
+
+        gram = self.__gram[ix_(indexes, indexes)]
+        factors, mean_squared_error = solve_normal_equations(
+            gram, self.__moments[indexes], self.__squares, len(self.times))
+        design = self.__matrix[:, indexes]
+        residuals = self.times - design.dot(factors)
+        if self.__root is not None:
+            design = design*self.__root[:, None]
+        # H = X (X'X)^+ X', only its diagonal is needed
+        inverse = pinv(gram, hermitian=True)
+        leverages = (design.dot(inverse)*design).sum(axis=1)
+        return Approximation(base, self.measurements,
+                             factors/self.__scale[indexes],
+                             mean_squared_error, self.weights,
+                             residuals=residuals, leverages=leverages)
@@ -1,6 +1,10 @@
 """Logger parts used by complexity determinant"""
 from enum import Enum
+import atexit
+import os
+import queue
 import sys
+import threading
 
 
 class LoggingLevel(Enum):
@@ -25,28 +29,143 @@ class LoggingOutput(Enum):
 
 
 class Logger:
-    """Simple logger"""
+    """
+        Simple logger. Messages are formatted only when they are going
+        to be written, the log file stays open and is flushed in batches,
+        warnings and errors at once. start_background moves writing
+        to a separate thread
+    """
     logging_output = LoggingOutput.STDOUT
     logging_file = "./log.txt"
     minimum_log_level = LoggingLevel.DEBUG
 
+    __file = None
+    __file_name = None
+    __lock = threading.RLock()
+    __queue = None
+    __thread = None
+
+    @classmethod
+    def enabled(cls, level):
+        """Returns information if messages of given level are written"""
+        return (cls.logging_output is not LoggingOutput.NONE and
+                not cls.minimum_log_level > level)
+
     @classmethod
-    def log(cls, what, level=LoggingLevel.DEBUG):
-        """Logs given string"""
-        if cls.minimum_log_level > level:
+    def log(cls, what, level=LoggingLevel.DEBUG, *args):
+        """
+            Logs given string. When args are given the string is
+            formatted with them, only if the message is going to be written
+        """
+        if (cls.logging_output is LoggingOutput.NONE or
+                cls.minimum_log_level > level):
+            return
+        if args:
+            what = what.format(*args)
+        if cls.__queue is not None:
+            cls.__queue.put(what)
             return
         cls.__write(what)
+        if not level < LoggingLevel.WARN:
+            # Processes killed or ending by os._exit lose buffered lines
+            cls._flush_file()
 
     @classmethod
     def __write(cls, what):
-        {
-            LoggingOutput.STDOUT: lambda: print(what),
-            LoggingOutput.STDERR: lambda: print(what, file=sys.stderr),
-            LoggingOutput.NONE: lambda: None,
-            LoggingOutput.FILE: lambda: cls.__write_to_file(what)
-        }[cls.logging_output]()
+        output = cls.logging_output
+        if output is LoggingOutput.STDOUT:
+            print(what)
+        elif output is LoggingOutput.STDERR:
+            print(what, file=sys.stderr)
+        elif output is LoggingOutput.FILE:
+            cls.__write_to_file(what)
 
     @classmethod
     def __write_to_file(cls, what):
-        with open(cls.logging_file, "a") as file:
-            file.write(what)
+        with cls.__lock:
+            if cls.__file is None or cls.__file_name != cls.logging_file:
+                cls.close()
+                cls.__file = open(cls.logging_file, "a")
+                cls.__file_name = cls.logging_file
+            cls.__file.write(what + "\n")
+
+    @classmethod
+    def flush(cls):
+        """Writes buffered messages"""
+        messages = cls.__queue
+        if messages is not None:
+            messages.join()
+        cls._flush_file()
+
+    @classmethod
+    def close(cls):
+        """Flushes and closes the log file"""
+        with cls.__lock:
+            if cls.__file is not None:
+                cls.__file.close()
+                cls.__file = None
+
+    @classmethod
+    def start_background(cls, batch=1000):
+        """Writes messages in a background thread, up to batch at once"""
+        with cls.__lock:
+            if cls.__thread is not None:
+                return
+            cls.__queue = queue.Queue()
+            cls.__thread = threading.Thread(target=cls.__consume,
+                                            args=(cls.__queue, batch),
+                                            daemon=True)
+            cls.__thread.start()
+
+    @classmethod
+    def stop_background(cls):
+        """Writes queued messages and stops the background thread"""
+        with cls.__lock:
+            messages, thread = cls.__queue, cls.__thread
+            cls.__queue = cls.__thread = None
+        if thread is not None:
+            messages.put(None)
+            thread.join()
+        cls.flush()
+
+    @classmethod
+    def __consume(cls, messages, batch):
+        """Background thread writing queued messages in batches"""
+        while True:
+            lines = [messages.get()]
+            while len(lines) < batch:
+                try:
+                    lines.append(messages.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in lines
+            text = "\n".join(line for line in lines if line is not None)
+            if text:
+                cls.__write(text)
+                cls._flush_file()
+            for _ in lines:
+                messages.task_done()
+            if stop:
+                return
+
+    @classmethod
+    def _flush_file(cls):
+        """Flushes the log file without waiting for the background thread"""
+        with cls.__lock:
+            if cls.__file is not None:
+                cls.__file.flush()
+
+    @classmethod
+    def _after_fork(cls):
+        """Forked child has no background thread, it writes directly"""
+        cls.__lock = threading.RLock()
+        cls.__queue = cls.__thread = None
+        cls.__file = None
+
+
+atexit.register(Logger.stop_background)
+atexit.register(Logger.close)
+if hasattr(os, 'register_at_fork'):
+    # Buffered messages mustn't be written twice by parent and child
+    os.register_at_fork(before=Logger._flush_file,
+                        after_in_child=Logger._after_fork)
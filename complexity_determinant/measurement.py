@@ -0,0 +1,181 @@
+"""Measuring execution time and memory of single problems"""
+import gc
+import tracemalloc
+from time import perf_counter
+from .logger import Logger, LoggingLevel
+from .memory import (MemoryMeasure, peak_memory, release_free_memory,
+                     reset_peak_memory, resident_memory)
+from .timeout import Deadline, TimeoutExceeded
+from .timer import Clock, Timer
+
+
+class TestedFunctionError(Exception):
+    """Exception thrown when tested function throws an exception"""
+    pass
+
+
+def execute_function(test, problem, clock=Clock.PROCESS_TIME, number=1,
+                     disable_gc=False):
+    """
+        Executes tested function number times in a loop and returns
+        execution time of one call by clock. disable_gc disables garbage
+        collector while the loop is timed
+    """
+    enabled = gc.isenabled()
+    try:
+        timer = Timer(clock)
+        calls = range(number)
+        if disable_gc:
+            gc.disable()
+        timer.start()
+        for _ in calls:
+            test(problem)
+        timer.stop()
+        return timer.time/number
+    except TimeoutExceeded as exceded:
+        # We might catch this exception accidently
+        raise exceded
+    except Exception as e:
+        Logger.log(str(e), LoggingLevel.ERR)
+        raise TestedFunctionError
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def autorange(test, problem, sampling):
+    """
+        Returns (number, times). Number of calls in a loop is chosen like
+        timeit does, 1, 2, 5, 10, 20... until the loop takes at least
+        min_time of sampling. Times contain the first call if it took
+        that long alone, usable as a sample
+    """
+    number = 1
+    while True:
+        for multiplier in (1, 2, 5):
+            calls = number*multiplier
+            time = execute_function(test, problem, sampling.clock, calls,
+                                    sampling.disable_gc)
+            if time*calls >= sampling.min_time:
+                return calls, [time] if calls == 1 else []
+        number *= 10
+
+
+class GarbageCollection:
+    """Context manager summing pauses of garbage collections [s] in pause"""
+    def __init__(self):
+        self.pause = 0.0
+        self.__started = None
+
+    def __collecting(self, phase, info):
+        """Callback of the garbage collector"""
+        if phase == 'start':
+            self.__started = perf_counter()
+        elif self.__started is not None:
+            self.pause += perf_counter() - self.__started
+            self.__started = None
+
+    def __enter__(self):
+        gc.callbacks.append(self.__collecting)
+        return self
+
+    def __exit__(self, *exception):
+        gc.callbacks.remove(self.__collecting)
+        return False
+
+
+def measure_problem(test, problem, sampling, size, samples,
+                    size_timeout=None, pauses=None):
+    """
+        Stores samples of problem of given size in samples, time of one
+        call each. Calls taking less than min_time of sampling are
+        repeated in a loop. Time of garbage collections while measuring
+        is stored in pauses if given.
+        Returns False if measuring exceeded size_timeout [s]
+    """
+    deadline = Deadline(size_timeout)
+    try:
+        with deadline, GarbageCollection() as collection:
+            number, measured = 1, ()
+            if sampling.min_time is not None:
+                number, measured = autorange(test, problem, sampling)
+            samples[size] = sampling.measure(
+                lambda: execute_function(test, problem, sampling.clock,
+                                         number, sampling.disable_gc),
+                measured, number)
+        if pauses is not None:
+            pauses[size] = collection.pause
+    except TestedFunctionError:
+        Logger.log("Raised exception for size {}.", LoggingLevel.ERR, size)
+    except TimeoutExceeded as exceeded:
+        if exceeded.deadline is not deadline:
+            raise exceeded
+        samples.pop(size, None)
+        log_overrun(size, size_timeout)
+        return False
+    return True
+
+
+def log_overrun(size, size_timeout):
+    """Logs that problem of given size exceeded its time"""
+    Logger.log("Size {} exceeded {}s, bigger sizes are skipped",
+               LoggingLevel.WARN, size, size_timeout)
+
+
+def reaches(size, other):
+    """
+        Returns information if size is at least other size, tuple sizes
+        of several variables must be at least other in every variable
+    """
+    if isinstance(size, tuple):
+        return all(value >= limit for value, limit in zip(size, other))
+    return size >= other
+
+
+def summarize(samples, sampling):
+    """Returns list of (size, time) tuples summarizing samples"""
+    return [(size, sampling.statistic(times))
+            for size, times in samples.items()]
+
+
+def exceeds_memory(size, memory_limit):
+    """Returns information if created problem exceeds memory limit"""
+    if memory_limit is None:
+        return False
+    memory = resident_memory()
+    if memory is None or memory <= memory_limit:
+        return False
+    Logger.log("Problem of size {} exceeds memory limit, {}B used",
+               LoggingLevel.WARN, size, memory)
+    return True
+
+
+def measure_memory(test, problem, method):
+    """
+        Returns peak memory [B] used while test(problem) runs, measured
+        by MemoryMeasure method, None on failure. RSS is meaningful
+        in a process dedicated to the measurement
+    """
+    try:
+        if method is MemoryMeasure.TRACEMALLOC:
+            started = not tracemalloc.is_tracing()
+            if started:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            try:
+                test(problem)
+                return tracemalloc.get_traced_memory()[1] - baseline
+            finally:
+                if started:
+                    tracemalloc.stop()
+        release_free_memory()
+        reset_peak_memory()
+        baseline = resident_memory()
+        test(problem)
+        return max(peak_memory() - baseline, 0)
+    except TimeoutExceeded as exceded:
+        raise exceded
+    except Exception as e:
+        Logger.log(str(e), LoggingLevel.ERR)
+        return None
@@ -0,0 +1,84 @@
+"""Memory usage of the current process"""
+import ctypes
+import ctypes.util
+import gc
+import os
+import sys
+from enum import Enum
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def resident_memory():
+    """
+        Returns resident set size of the process in bytes.
+        Falls back to the peak size on systems without procfs,
+        None if it can't be determined at all
+    """
+    try:
+        with open('/proc/self/statm') as statm:
+            pages = int(statm.read().split()[1])
+        return pages*os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        pass
+    return _maximum_resident_memory()
+
+
+def _maximum_resident_memory():
+    """Returns peak resident memory from getrusage or None"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes everywhere but on macOS
+    return peak if sys.platform == 'darwin' else peak*1024
+
+
+class MemoryMeasure(Enum):
+    """Methods of measuring memory used by tested function"""
+    TRACEMALLOC = "tracemalloc"
+    RSS = "rss"
+
+    def __str__(self):
+        return self.value
+
+
+_malloc_trim = None
+
+
+def release_free_memory():
+    """Returns memory freed by the process to the system where possible"""
+    global _malloc_trim
+    gc.collect()
+    if _malloc_trim is None:
+        try:
+            _malloc_trim = ctypes.CDLL(
+                ctypes.util.find_library('c')).malloc_trim
+        except (OSError, AttributeError, TypeError):
+            _malloc_trim = False
+    if _malloc_trim:
+        # glibc keeps freed memory for reuse, then it doesn't show in RSS
+        _malloc_trim(0)
+
+
+def reset_peak_memory():
+    """Resets peak resident memory of the process, Linux only"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def peak_memory():
+    """Returns peak resident memory of the process in bytes or None"""
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])*1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return _maximum_resident_memory()
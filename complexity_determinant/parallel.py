@@ -0,0 +1,252 @@
+"""Measuring problems in other processes"""
+import multiprocessing
+import os
+import queue
+from time import perf_counter
+from .events import Recorder, span
+from .logger import Logger, LoggingLevel
+from .measurement import (exceeds_memory, log_overrun, measure_memory,
+                          measure_problem)
+from .problems import indexable, problems
+
+# (structure, test, sampling, memory_limit, size_timeout, overrun, space,
+# observed) of the worker process
+_job = None
+
+
+def _initialize(job, counter, pin):
+    """Prepares worker process, optionally pins it to its own core"""
+    global _job
+    _job = job
+    if not pin:
+        return
+    if not hasattr(os, 'sched_setaffinity'):
+        Logger.log("Pinning workers is not supported", LoggingLevel.WARN)
+        return
+    with counter.get_lock():
+        index = counter.value
+        counter.value += 1
+    cores = sorted(os.sched_getaffinity(0))
+    os.sched_setaffinity(0, {cores[index % len(cores)]})
+
+
+def _measure(size, create, setup):
+    """
+        Returns (size, samples, memory, pause, events), samples, memory
+        and pause of garbage collections are None on failure or when they
+        are not measured. Events are recorded only when the parent
+        observes them, setup only when create makes the problem here
+    """
+    try:
+        return _measure_created(size, create, setup)
+    finally:
+        # Workers exit by os._exit, atexit doesn't write their log
+        Logger.flush()
+
+
+def _measure_created(size, create, setup):
+    """Implementation of _measure"""
+    (structure, test, sampling, memory_limit, size_timeout, overrun,
+     space, observed) = _job
+    recorder = Recorder() if observed else None
+    events = recorder.events if observed else None
+    # Shared overrun holds a number, problems of tuple sizes are limited
+    # only by their own size_timeout
+    scalar = not isinstance(size, tuple)
+    if scalar and size > overrun.value:
+        return size, None, None, None, events
+    with span(recorder if setup else None, 'setup', size):
+        problem = create()
+    if exceeds_memory(size, memory_limit):
+        return size, None, None, None, events
+    samples = {}
+    pauses = {}
+    with span(recorder, 'measure', size) as measured:
+        in_time = measure_problem(test, problem, sampling, size, samples,
+                                  size_timeout, pauses)
+        if not in_time and scalar:
+            with overrun.get_lock():
+                overrun.value = min(overrun.value, size)
+        measured.repeat = len(samples.get(size, ()))
+        measured.gc = pauses.get(size)
+    memory = None
+    if space is not None and size in samples:
+        # Worker is a separate process, RSS can be measured here
+        with span(recorder, 'memory', size) as measured:
+            memory = measure_memory(test, problem, space)
+            measured.memory = memory
+    return size, samples.get(size), memory, pauses.get(size), events
+
+
+def _measure_size(size):
+    """Measures problem looked up in the structure inherited by worker"""
+    return _measure(size, lambda: _job[0][size], True)
+
+
+def _measure_pair(pair):
+    """Measures problem sent to the worker, created by the parent"""
+    return _measure(pair[0], lambda: pair[1], False)
+
+
+def _completed(pool, function, arguments, workers):
+    """
+        Yields results of function(argument) computed by pool in order
+        of completion. The next argument is taken only when fewer than
+        workers tasks run, so problems of lazy iterables are created just
+        before a worker is free, not all at once
+    """
+    finished = queue.Queue()
+    arguments = iter(arguments)
+    running = 0
+    exhausted = False
+    while True:
+        while not exhausted and running < workers:
+            argument = next(arguments, None)
+            if argument is None:
+                exhausted = True
+                break
+            pool.apply_async(
+                function, (argument,),
+                callback=lambda result: finished.put((False, result)),
+                error_callback=lambda error: finished.put((True, error)))
+            running += 1
+            # The pool keeps the argument only until it's sent
+            del argument
+        if not running:
+            return
+        try:
+            # Short waits let the caller's deadline interrupt us
+            failed, result = finished.get(timeout=0.05)
+        except queue.Empty:
+            continue
+        running -= 1
+        if failed:
+            raise result
+        yield result
+
+
+def measure_parallel(structure, test, sampling, samples, workers,
+                     pin=False, memory_limit=None, size_timeout=None,
+                     wanted=None, space=None, memory=None, observer=None,
+                     pauses=None):
+    """
+        Measures problems in at most workers processes at once and stores
+        their samples in samples. Dict-like structures are inherited by
+        (or sent once to) workers which look problems up by size,
+        problems of other iterables are created and sent one by one when
+        a worker is free.
+        pin - pins every worker to a separate core
+        size_timeout - max time of one problem [s], once a problem exceeds
+                       it bigger ones are skipped
+        wanted - problems of sizes rejected by wanted(size) are skipped
+        space - MemoryMeasure, memory used by problems is stored in memory
+        observer - Observer receiving events recorded by workers
+        pauses - pauses of garbage collections are stored in it if given
+    """
+    lookup = indexable(structure)
+    counter = multiprocessing.Value('i', 0)
+    overrun = multiprocessing.Value('d', float('inf'))
+    job = (structure if lookup else None, test, sampling, memory_limit,
+           size_timeout, overrun, space, observer is not None)
+    pool = multiprocessing.Pool(workers, _initialize, (job, counter, pin))
+    try:
+        if lookup:
+            sizes = [size for size in structure.keys()
+                     if wanted is None or wanted(size)]
+            results = _completed(pool, _measure_size, sizes, workers)
+        else:
+            results = _completed(pool, _measure_pair,
+                                 problems(structure, wanted, observer),
+                                 workers)
+        for size, times, usage, pause, events in results:
+            if times is not None:
+                samples[size] = times
+            if usage is not None:
+                memory[size] = usage
+            if pause is not None and pauses is not None:
+                pauses[size] = pause
+            for event in events or ():
+                observer.observe(event)
+    finally:
+        # Running measurements are killed e.g. on timeout
+        pool.terminate()
+        pool.join()
+
+
+def _child(function, args, connection):
+    """Sends result of function(*args) to the parent"""
+    try:
+        result = function(*args)
+    finally:
+        # The process exits by os._exit, atexit doesn't write its log
+        Logger.flush()
+    connection.send(result)
+    connection.close()
+
+
+def call_isolated(function, args, seconds=None):
+    """
+        Calls function(*args) in its own process, killed once seconds
+        elapse. Returns (finished, result), result is None if the process
+        died
+    """
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(target=_child,
+                                      args=(function, args, sender),
+                                      daemon=True)
+    started = perf_counter()
+    process.start()
+    sender.close()
+    try:
+        # Short waits let the caller's deadline interrupt us
+        while not receiver.poll(0.05):
+            if seconds is not None and perf_counter() - started > seconds:
+                return False, None
+        try:
+            return True, receiver.recv()
+        except EOFError:
+            Logger.log("Measuring process died", LoggingLevel.ERR)
+            return True, None
+    finally:
+        process.terminate()
+        process.join()
+        receiver.close()
+
+
+def _samples(test, problem, sampling, size):
+    """
+        Returns samples of the problem and pause of garbage collections,
+        None on failure
+    """
+    samples = {}
+    pauses = {}
+    measure_problem(test, problem, sampling, size, samples, pauses=pauses)
+    return samples.get(size), pauses.get(size)
+
+
+def measure_isolated(test, problem, sampling, size, samples,
+                     size_timeout=None, pauses=None):
+    """
+        Stores samples of problem of given size in samples and pause
+        of garbage collections in pauses. The problem is measured in its
+        own process, killed once size_timeout [s] elapses.
+        Returns False if the process was killed
+    """
+    finished, result = call_isolated(
+        _samples, (test, problem, sampling, size), size_timeout)
+    if not finished:
+        log_overrun(size, size_timeout)
+        return False
+    if result is None:
+        return True
+    times, pause = result
+    if times is not None:
+        samples[size] = times
+    if pause is not None and pauses is not None:
+        pauses[size] = pause
+    return True
+
+
+def measure_memory_isolated(test, problem, method):
+    """Returns measure_memory of the problem run in its own process"""
+    return call_isolated(measure_memory, (test, problem, method))[1]
@@ -0,0 +1,61 @@
+"""Data structures with problems created on demand"""
+from .events import span
+
+
+class LazyStructure:
+    """
+        Replacement for data_structure dict, every problem is created
+        by factory(size) just before it's measured
+    """
+    def __init__(self, factory, sizes):
+        self.factory = factory
+        self.sizes = sizes
+
+    def __getitem__(self, size):
+        """Creates problem of given size"""
+        return self.factory(size)
+
+    def keys(self):
+        """Returns sizes of problems"""
+        return self.sizes
+
+    def items(self):
+        """Yields (size, problem) pairs creating problems one by one"""
+        for size in self.sizes:
+            yield size, self.factory(size)
+
+    def __len__(self):
+        return len(self.sizes)
+
+
+def indexable(structure):
+    """Returns information if problems can be looked up by size"""
+    return hasattr(structure, 'keys') and hasattr(structure, '__getitem__')
+
+
+def _create(create, size, observer):
+    """Returns problem made by create, reported as setup to observer"""
+    with span(observer, 'setup', size):
+        return create()
+
+
+def problems(structure, wanted=None, observer=None):
+    """
+        Yields (size, problem) pairs from dict-like structure or from
+        iterable of pairs, e.g. a generator. Problems of sizes rejected
+        by wanted(size) are skipped, lazy ones aren't even created.
+        Creating problems is reported to observer as setup
+    """
+    if indexable(structure):
+        pairs = ((size, lambda size=size: structure[size])
+                 for size in list(structure.keys()))
+    elif hasattr(structure, 'items'):
+        pairs = ((size, lambda problem=problem: problem)
+                 for size, problem in structure.items())
+    else:
+        pairs = ((size, lambda problem=problem: problem)
+                 for size, problem in structure)
+    for size, create in pairs:
+        if wanted is None or wanted(size):
+            # Generator mustn't keep the problem while the next one is made
+            yield size, _create(create, size, observer)
@@ -0,0 +1,31 @@
+"""Losses of robust fitting resistant to outlying measurements"""
+from enum import Enum
+
+# Standardized residual over it marks an outlier
+OUTLIER = 3.0
+
+
+class Loss(Enum):
+    """
+        Robust losses of iteratively reweighted least squares.
+        Huber weighs down big residuals, Tukey's biweight rejects them
+    """
+    HUBER = "huber"
+    TUKEY = "tukey"
+
+    def __str__(self):
+        return self.value
+
+    @property
+    def tuning(self):
+        """Returns tuning constant giving 95% efficiency for normal errors"""
+        if self is Loss.HUBER:
+            return 1.345
+        return 4.685
+
+    def weights(self, residuals):
+        """Returns weights of residuals standardized by their scale"""
+        scaled = abs(residuals)/self.tuning
+        if self is Loss.HUBER:
+            return 1/scaled.clip(min=1)
+        return (1 - scaled**2).clip(min=0)**2
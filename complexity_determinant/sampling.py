@@ -0,0 +1,111 @@
+"""Repeated measurements of a single problem"""
+from enum import Enum
+from math import ceil, floor, fsum, sqrt
+from statistics import median
+from .timer import Clock
+
+
+class Statistic(Enum):
+    """Statistics summarizing samples of one problem"""
+    MIN = "min"
+    MEDIAN = "median"
+    MEAN = "mean"
+    TRIMMED_MEAN = "trimmed mean"
+
+    def __str__(self):
+        return self.value
+
+    def __call__(self, samples):
+        """Returns summarized samples"""
+        samples = [float(sample) for sample in samples]
+        if self is Statistic.MIN:
+            return min(samples)
+        if self is Statistic.MEDIAN:
+            return median(samples)
+        if self is Statistic.MEAN:
+            return fsum(samples)/len(samples)
+        # Cut 10% of samples from both sides
+        cut = int(len(samples)*0.1)
+        kept = sorted(samples)[cut:len(samples)-cut]
+        return fsum(kept)/len(kept)
+
+
+def median_uncertainty(samples, z=1.96):
+    """
+        Returns half-width of the median's confidence interval relative
+        to the median. Distribution free, based on order statistics.
+        A single sample tells nothing about its spread, inf then
+    """
+    samples = sorted(float(sample) for sample in samples)
+    count = len(samples)
+    if count < 2:
+        return float('inf')
+    offset = z*sqrt(count)/2
+    low = max(int(floor(count/2 - offset)), 0)
+    high = min(int(ceil(count/2 + offset)), count-1)
+    middle = median(samples)
+    if middle <= 0:
+        return float('inf')
+    return float((samples[high]-samples[low])/(2*middle))
+
+
+class Sampling:
+    """
+        Describes how each problem is measured.
+        warmup - runs executed before measuring, results are discarded
+        repeat - number of samples, minimal one in the adaptive mode
+        statistic - Statistic used to summarize samples
+        precision - enables the adaptive mode, sampling continues until
+                    median_uncertainty of samples drops below precision
+        budget - max total time of samples in the adaptive mode [s],
+                 all calls of samples timed in a loop included
+        max_repeat - max number of samples in the adaptive mode
+        clock - Clock measuring execution time
+        min_time - min time of one sample [s], faster calls are repeated
+                   in a loop and a sample is the time of one call of it.
+                   None measures every call alone
+        disable_gc - disables garbage collector while a sample is timed
+    """
+    def __init__(self, repeat=1, warmup=0, statistic=Statistic.MEDIAN,
+                 precision=None, budget=1.0, max_repeat=1000,
+                 clock=Clock.PROCESS_TIME, min_time=1e-3, disable_gc=False):
+        if repeat < 1:
+            raise ValueError("At least one sample is required")
+        self.repeat = repeat
+        self.warmup = warmup
+        self.statistic = statistic
+        self.precision = precision
+        self.budget = budget
+        self.max_repeat = max_repeat
+        self.clock = clock
+        self.min_time = min_time
+        self.disable_gc = disable_gc
+
+    @property
+    def adaptive(self):
+        """Returns information if sampling is adaptive"""
+        return self.precision is not None
+
+    def measure(self, measure, measured=(), number=1):
+        """
+            Returns list of samples.
+            measure - executes the problem and returns its time
+            measured - times of runs done already, e.g. while calibrating,
+                       used as warmup first and then as samples
+            number - calls timed by one sample, which is time of one call
+        """
+        measured = list(measured)
+        warmed = min(self.warmup, len(measured))
+        for _ in range(self.warmup - warmed):
+            measure()
+
+        samples = measured[warmed:warmed+self.repeat]
+        samples += [measure() for _ in range(self.repeat - len(samples))]
+        if not self.adaptive:
+            return samples
+
+        while (len(samples) < self.max_repeat and
+               sum(samples)*number < self.budget and
+               median_uncertainty(samples) > self.precision):
+            samples.append(measure())
+        return samples
@@ -0,0 +1,12 @@
+"""Problem sizes to be measured"""
+from math import ceil
+
+
+def geometric_sizes(minimum, maximum, ratio=2):
+    """Yields integer sizes from minimum to maximum growing by ratio"""
+    if ratio <= 1:
+        raise ValueError("Ratio must be greater than 1")
+    size = minimum
+    while size <= maximum:
+        yield size
+        size = max(int(ceil(size*ratio)), size+1)
@@ -0,0 +1,119 @@
+"""Problems serialized once to disk and memory-mapped when measured"""
+import json
+import mmap
+import os
+import pickle
+import sys
+
+INDEX = 'index.json'
+# Out-of-band buffers start at multiples of it, as numpy prefers
+ALIGNMENT = 64
+
+
+def is_store(path):
+    """Returns information if path is a directory with a problem store"""
+    return os.path.isfile(os.path.join(path, INDEX))
+
+
+def _is_array(problem):
+    """Returns information if problem can be saved as .npy"""
+    numpy = sys.modules.get('numpy')
+    return (numpy is not None and type(problem) is numpy.ndarray and
+            not problem.dtype.hasobject)
+
+
+def _save_pickle(problem, name):
+    """
+        Saves problem as pickle protocol 5 stream with buffers, e.g. ones
+        of numpy arrays, out of band in a separate file.
+        Returns (offset, length) pairs of the buffers
+    """
+    buffers = []
+    with open(name + '.pickle', 'wb') as stream:
+        pickle.dump(problem, stream, protocol=5,
+                    buffer_callback=buffers.append)
+    spans = []
+    if not buffers:
+        return spans
+    with open(name + '.buffers', 'wb') as raw:
+        for buffer in buffers:
+            data = buffer.raw()
+            raw.write(b'\0'*(-raw.tell() % ALIGNMENT))
+            spans.append((raw.tell(), data.nbytes))
+            raw.write(data)
+    return spans
+
+
+def materialize(structure, path):
+    """
+        Serializes every problem of data structure into directory path,
+        numpy arrays as .npy, other problems with pickle protocol 5 with
+        buffers, e.g. of arrays inside them, out of band. Only arrays and
+        buffers are memory-mapped by the returned ProblemStore
+    """
+    from .problems import problems
+    os.makedirs(path, exist_ok=True)
+    entries = []
+    for number, (size, problem) in enumerate(problems(structure)):
+        name = os.path.join(path, str(number))
+        if _is_array(problem):
+            import numpy
+            numpy.save(name + '.npy', problem, allow_pickle=False)
+            entries.append({'size': size, 'format': 'npy'})
+        else:
+            entries.append({'size': size, 'format': 'pickle',
+                            'buffers': _save_pickle(problem, name)})
+    # The index is written last, a partial store isn't recognized
+    with open(os.path.join(path, INDEX), 'w') as index:
+        json.dump(entries, index)
+    return ProblemStore(path)
+
+
+class ProblemStore:
+    """
+        Replacement for data_structure dict reading problems saved
+        by materialize. Numpy arrays and other buffers are memory-mapped,
+        not copied: they share read-only pages of the files between
+        processes, so tested functions mustn't modify them in place.
+        Other objects, e.g. lists of ints, are unpickled into a private
+        copy on every lookup, the store only saves creating them again
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, INDEX)) as index:
+            entries = json.load(index)
+        # JSON turns tuples of sizes into lists
+        self.entries = {
+            tuple(entry['size']) if isinstance(entry['size'], list)
+            else entry['size']: (number, entry)
+            for number, entry in enumerate(entries)}
+
+    def __getitem__(self, size):
+        """Loads problem of given size"""
+        number, entry = self.entries[size]
+        name = os.path.join(self.path, str(number))
+        if entry['format'] == 'npy':
+            import numpy
+            return numpy.load(name + '.npy', mmap_mode='r')
+        # Empty files can't be mapped, buffers of zero length need none
+        buffers = [b'']*len(entry['buffers'])
+        if any(length for _, length in entry['buffers']):
+            with open(name + '.buffers', 'rb') as raw:
+                mapped = memoryview(
+                    mmap.mmap(raw.fileno(), 0, access=mmap.ACCESS_READ))
+            buffers = [mapped[offset:offset+length]
+                       for offset, length in entry['buffers']]
+        with open(name + '.pickle', 'rb') as stream:
+            return pickle.load(stream, buffers=buffers)
+
+    def keys(self):
+        """Returns sizes of problems"""
+        return list(self.entries)
+
+    def items(self):
+        """Yields (size, problem) pairs loading problems one by one"""
+        for size in self.entries:
+            yield size, self[size]
+
+    def __len__(self):
+        return len(self.entries)
@@ -1,29 +1,81 @@
-"""Decorator for setting a time constraint on a function"""
+"""Time constraints working in any thread"""
+import ctypes
+import threading
 from functools import wraps
-import signal
 
 
 class TimeoutExceeded(Exception):
     """Exception thrown when the execution exceeds timeout"""
-    pass
+    # Deadline which raised the exception
+    deadline = None
+
+
+def _raise_in_thread(thread, exception):
+    """Schedules exception in given thread, None cancels scheduled one"""
+    if exception is None:
+        exception = ctypes.py_object()  # NULL
+    else:
+        exception = ctypes.py_object(exception)
+    ctypes.pythonapi.PyThreadState_SetAsyncExc(ctypes.c_ulong(thread),
+                                               exception)
+
+
+class Deadline:
+    """
+        Context manager raising TimeoutExceeded in the thread which entered
+        it once seconds (float) elapse, no limit for None. Works outside
+        of the main thread and deadlines may be nested, the exception's
+        deadline attribute tells which one expired. Like with signals the
+        exception is raised between Python instructions, so a long running
+        call into C code finishes first
+    """
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.expired = False
+        self.__exception = type('TimeoutExceeded', (TimeoutExceeded,),
+                                {'deadline': self})
+        self.__lock = threading.Lock()
+        self.__timer = None
+        self.__thread = None
+        self.__active = False
+
+    def __enter__(self):
+        with self.__lock:
+            if self.expired:
+                raise self.__exception()
+            self.__thread = threading.get_ident()
+            self.__active = True
+        if self.seconds is not None:
+            self.__timer = threading.Timer(self.seconds, self.expire)
+            self.__timer.daemon = True
+            self.__timer.start()
+        return self
+
+    def expire(self):
+        """Expires the deadline now, e.g. from another thread"""
+        with self.__lock:
+            self.expired = True
+            if self.__active:
+                _raise_in_thread(self.__thread, self.__exception)
+
+    def __exit__(self, kind, value, traceback):
+        if self.__timer is not None:
+            self.__timer.cancel()
+        with self.__lock:
+            was_active, self.__active = self.__active, False
+            if (was_active and self.expired and
+                    not isinstance(value, self.__exception)):
+                # Not delivered yet, it mustn't escape the block
+                _raise_in_thread(self.__thread, None)
+        return False
 
 
-# Thanks to David Narayan
-# http://stackoverflow.com/questions/2281850/timeout-function-if-it-takes-too-long-to-finish
 def timeout(seconds):
     """Decorator used for adding time constraints"""
     def decorator(func):
-        def _handle_timeout(signum, frame):
-            raise TimeoutExceeded()
-
         def wrapper(*args, **kwargs):
-            signal.signal(signal.SIGALRM, _handle_timeout)
-            signal.alarm(seconds)
-            try:
-                result = func(*args, **kwargs)
-            finally:
-                signal.alarm(0)
-            return result
+            with Deadline(seconds):
+                return func(*args, **kwargs)
 
         return wraps(func)(wrapper)
 
@@ -1,21 +1,130 @@
 """Timer for getting execution time"""
-from time import process_time
+import time
+from enum import Enum
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+
+class Clock(Enum):
+    """
+        Clocks measuring execution time.
+        PERF_COUNTER - wall time, includes I/O, sleeping and waiting
+        THREAD_TIME - CPU time of the current thread only
+        PROCESS_TIME - CPU time of all threads of the process
+        RUSAGE - user and system CPU time reported by getrusage
+    """
+    PERF_COUNTER = "perf_counter"
+    THREAD_TIME = "thread_time"
+    PROCESS_TIME = "process_time"
+    RUSAGE = "rusage"
+
+    def __str__(self):
+        return self.value
+
+    def __call__(self):
+        """Returns reading of the clock [ns]"""
+        return self.reader()
+
+    @property
+    def reader(self):
+        """Returns function reading the clock [ns]"""
+        if self is Clock.PERF_COUNTER:
+            return time.perf_counter_ns
+        if self is Clock.THREAD_TIME:
+            return time.thread_time_ns
+        if self is Clock.PROCESS_TIME:
+            return time.process_time_ns
+        if resource is None:
+            raise NotImplementedError("getrusage is not available")
+        return _rusage_ns
+
+    @property
+    def cpu(self):
+        """Returns information if the clock measures CPU time"""
+        return self is not Clock.PERF_COUNTER
+
+
+def _rusage_ns():
+    """Returns user and system CPU time of the process [ns]"""
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return int((usage.ru_utime + usage.ru_stime)*1e9)
+
+
+# (wall, CPU) overhead [ns] of an empty measurement by each CPU clock
+_overheads = {}
+
+
+def calibrate(cpu_clock, rounds=1000):
+    """
+        Returns (wall, CPU) overhead [ns] of starting and stopping Timer,
+        the minimum of rounds empty measurements. Calibrated once for each
+        clock, on the first Timer using it
+    """
+    if cpu_clock not in _overheads:
+        # Uncalibrated timers of the clock measure nothing
+        _overheads[cpu_clock] = (0, 0)
+        timer = Timer(cpu_clock)
+        walls = []
+        cpus = []
+        for _ in range(rounds):
+            timer.start()
+            timer.stop()
+            walls.append(timer.wall_ns)
+            cpus.append(timer.cpu_ns)
+        _overheads[cpu_clock] = (min(walls), min(cpus))
+    return _overheads[cpu_clock]
 
 
 class Timer:
-    """Simple timer"""
-    def __init__(self):
-        self.__beg = self.__end = 0
+    """
+        Timer recording wall and CPU time together, the time of clock
+        is the measured one. Overhead of the timer itself is subtracted
+    """
+    def __init__(self, clock=Clock.PROCESS_TIME):
+        self.clock = clock
+        # Wall clocks are measured with CPU time of the process
+        cpu_clock = clock if clock.cpu else Clock.PROCESS_TIME
+        self.__read_cpu = cpu_clock.reader
+        self.__overhead = calibrate(cpu_clock)
+        self.__wall_beg = self.__wall_end = 0
+        self.__cpu_beg = self.__cpu_end = 0
 
     def start(self):
         """Starts timer"""
-        self.__beg = process_time()
+        self.__cpu_beg = self.__read_cpu()
+        self.__wall_beg = time.perf_counter_ns()
 
     def stop(self):
         """Ends timer"""
-        self.__end = process_time()
+        self.__wall_end = time.perf_counter_ns()
+        self.__cpu_end = self.__read_cpu()
+
+    @property
+    def wall_ns(self):
+        """Returns wall time measured [ns]"""
+        elapsed = self.__wall_end - self.__wall_beg - self.__overhead[0]
+        return max(elapsed, 0)
+
+    @property
+    def cpu_ns(self):
+        """Returns CPU time measured [ns]"""
+        elapsed = self.__cpu_end - self.__cpu_beg - self.__overhead[1]
+        return max(elapsed, 0)
+
+    @property
+    def wall(self):
+        """Returns wall time measured [s]"""
+        return self.wall_ns/1e9
+
+    @property
+    def cpu(self):
+        """Returns CPU time measured [s]"""
+        return self.cpu_ns/1e9
 
     @property
     def time(self):
-        """Returns time measured"""
-        return self.__end-self.__beg
+        """Returns time measured by clock [s]"""
+        return self.cpu if self.clock.cpu else self.wall
@@ -1,4 +1,5 @@
 from complexity_determinant import complexity
+from complexity_determinant.problems import LazyStructure
 
 if __name__ == "__main__":
     determined_complexity = complexity.determine_from_files(
@@ -9,11 +10,10 @@ if __name__ == "__main__":
     print(determined_complexity.execution_time(10))
     print(determined_complexity.max_problem_size_for_time(10e-10))
 
-data_structure = {
-}
-
-for i in range(90, 100):
-    data_structure[i] = list(range(1, i*50000))
+# Problems are created one by one, just before they are measured
+data_structure = LazyStructure(
+    lambda i: list(range(1, i*50000)),
+    range(90, 100))
 
 
 def clean_function():
@@ -1,5 +1,6 @@
 import random
 from complexity_determinant import complexity
+from complexity_determinant.problems import LazyStructure
 
 if __name__ == "__main__":
     determined_complexity = complexity.determine_from_files(
@@ -10,11 +11,10 @@ if __name__ == "__main__":
     print(determined_complexity.execution_time(1000))
     print(determined_complexity.max_problem_size_for_time(1000))
 
-data_structure = {
-}
-
-for i in range(1, 10):
-    data_structure[i] = [random.randint(0, 100000) for x in range(i*100000)]
+# Problems are created one by one, just before they are measured
+data_structure = LazyStructure(
+    lambda i: [random.randint(0, 100000) for x in range(i*100000)],
+    range(1, 10))
 
 
 def clean_function():
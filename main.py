@@ -1,36 +1,314 @@
 import argparse
-from complexity_determinant import complexity, logger
+import importlib
+import sys
+from complexity_determinant import (batch, cache, compare, complexity, events,
+                                    logger, memory, robust, sampling, store,
+                                    timer)
 
 
-def run():
+def add_determination_arguments(parser):
+    """Adds arguments configuring determination"""
+    parser.add_argument(
+        '-t',
+        '--timeout',
+        type=float,
+        default=30,
+        help='Max execution time [s]')
+    parser.add_argument(
+        '-r',
+        '--repeat',
+        type=int,
+        default=1,
+        help='Samples per problem (minimum in the adaptive mode)')
+    parser.add_argument(
+        '-w',
+        '--warmup',
+        type=int,
+        default=0,
+        help='Discarded runs before measuring each problem')
+    parser.add_argument(
+        '-s',
+        '--statistic',
+        choices=[str(s) for s in sampling.Statistic],
+        default=str(sampling.Statistic.MEDIAN),
+        help='Statistic summarizing samples of a problem')
+    parser.add_argument(
+        '--clock',
+        choices=[str(c) for c in timer.Clock],
+        default=str(timer.Clock.PROCESS_TIME),
+        help='Clock measuring execution time: wall time, CPU time of '
+             'the thread or of the process, or getrusage user+sys time')
+    parser.add_argument(
+        '--min-time',
+        type=float,
+        default=1e-3,
+        help='Min time of one sample [s], faster calls are repeated in '
+             'a loop and timed together, 0 measures every call alone')
+    parser.add_argument(
+        '--disable-gc',
+        action='store_true',
+        help='Disables the garbage collector while samples are timed')
+    parser.add_argument(
+        '-p',
+        '--precision',
+        type=float,
+        help='Enables adaptive sampling until the relative confidence '
+             'interval of the median drops below this value')
+    parser.add_argument(
+        '-b',
+        '--budget',
+        type=float,
+        default=1.0,
+        help='Max time of adaptive sampling per problem [s]')
+    parser.add_argument(
+        '-m',
+        '--memory-limit',
+        type=int,
+        help='Max resident memory [MiB], bigger problems are skipped')
+    parser.add_argument(
+        '--size-timeout',
+        type=float,
+        help='Max time of one problem [s], bigger problems are skipped '
+             'once it is exceeded')
+    parser.add_argument(
+        '-c',
+        '--cache',
+        help='sqlite file caching measurements, only missing sizes '
+             'are measured')
+    parser.add_argument(
+        '--space',
+        choices=[str(m) for m in memory.MemoryMeasure],
+        help='Determines also space complexity, measuring memory by '
+             'tracemalloc or peak RSS of a separate process')
+    parser.add_argument(
+        '--criterion',
+        choices=[str(c) for c in complexity.Criterion],
+        default=str(complexity.Criterion.LOO),
+        help='Criterion selecting the best complexity: in-sample or '
+             'leave-one-out mean squared error, AIC or BIC')
+    parser.add_argument(
+        '--weighted',
+        action='store_true',
+        help='Fits by least squares weighted for variance growing with '
+             'execution time')
+    parser.add_argument(
+        '--robust',
+        choices=[str(loss) for loss in robust.Loss],
+        help='Fits robustly with Huber or Tukey loss, resisting outlying '
+             'measurements')
+    parser.add_argument(
+        '--trace',
+        help='Saves timeline of import, setup, measure, memory, clean '
+             'and fit phases to a Chrome trace-event JSON file')
+
+
+def determination_options(args):
+    """Returns determine's keyword arguments from parsed arguments"""
+    memory_limit = None
+    if args.memory_limit is not None:
+        memory_limit = args.memory_limit*2**20
+    measurement_cache = None
+    if args.cache is not None:
+        measurement_cache = cache.MeasurementCache(args.cache)
+    space = None
+    if args.space is not None:
+        space = memory.MemoryMeasure(args.space)
+    return {
+        'sampling': sampling.Sampling(
+            repeat=args.repeat,
+            warmup=args.warmup,
+            statistic=sampling.Statistic(args.statistic),
+            precision=args.precision,
+            budget=args.budget,
+            clock=timer.Clock(args.clock),
+            min_time=args.min_time or None,
+            disable_gc=args.disable_gc),
+        'memory_limit': memory_limit,
+        'size_timeout': args.size_timeout,
+        'cache': measurement_cache,
+        'space': space,
+        'criterion': complexity.Criterion(args.criterion),
+        'weights': complexity.relative_weights if args.weighted else None,
+        'loss': None if args.robust is None else robust.Loss(args.robust),
+        'observer': None if args.trace is None else events.ChromeTrace(),
+    }
+
+
+def run_batch(argv):
+    """Command-line interface of the batch mode"""
+    parser = argparse.ArgumentParser(
+        prog='main.py batch',
+        description='Runs determinations listed in a manifest and writes '
+                    'one JSON record per determination')
+    parser.add_argument(
+        'manifest',
+        help='File with one "data test clean" triple per line, '
+             '- for standard input')
+    parser.add_argument(
+        '-j',
+        '--jobs',
+        type=int,
+        help='Runs determinations in a pool of that many processes')
+    parser.add_argument(
+        '-o',
+        '--output',
+        help='File for JSON lines, standard output by default')
+    add_determination_arguments(parser)
+
+    args = parser.parse_args(argv)
+    if (args.jobs is not None and args.space is not None and
+            memory.MemoryMeasure(args.space) is memory.MemoryMeasure.RSS):
+        # Pool processes can't start the processes measuring RSS
+        parser.error('--space rss is not supported with --jobs')
+    # Standard output may carry the records
+    logger.Logger.logging_output = logger.LoggingOutput.STDERR
+    logger.Logger.minimum_log_level = logger.LoggingLevel.WARN
+
+    manifest = sys.stdin if args.manifest == '-' else open(args.manifest)
+    output = sys.stdout if args.output is None else open(args.output, 'w')
+    options = determination_options(args)
+    try:
+        batch.run_batch(batch.read_manifest(manifest), output, args.jobs,
+                        args.timeout, **options)
+        if args.trace is not None:
+            options['observer'].save(args.trace)
+    finally:
+        if manifest is not sys.stdin:
+            manifest.close()
+        if output is not sys.stdout:
+            output.close()
+
+
+def run_compare(argv):
+    """Command-line interface of comparing implementations"""
+    parser = argparse.ArgumentParser(
+        prog='main.py compare',
+        description='Measures several implementations on the same '
+                    'problems, interleaving their runs, and prints which '
+                    'one is the fastest for which sizes')
+    parser.add_argument(
+        'data',
+        help='Must contain a dictionary data_structure (size: problem), '
+             'or be a directory made by materialize')
+    parser.add_argument(
+        'clean',
+        help='Must contain a function clean_function')
+    parser.add_argument(
+        'tests',
+        nargs='+',
+        help='Files with tested_function, or a class with it, to compare')
+    parser.add_argument(
+        '--minimum',
+        type=float,
+        help='Smallest size of the table, the smallest measured one '
+             'by default')
+    parser.add_argument(
+        '--maximum',
+        type=float,
+        help='Biggest size of the table, the biggest measured one '
+             'by default')
+    add_determination_arguments(parser)
+
+    args = parser.parse_args(argv)
+    logger.Logger.minimum_log_level = logger.LoggingLevel.WARN
+    options = determination_options(args)
+    for unsupported in ('size_timeout', 'cache', 'space'):
+        if options.pop(unsupported) is not None:
+            parser.error('--{} is not supported by compare'.format(
+                unsupported.replace('_', '-')))
+    comparison = compare.compare_from_files(
+        args.data, args.tests, args.clean, args.timeout, **options)
+    if comparison is None:
+        return
+    for name, determined in comparison.complexities.items():
+        print('{}: {}'.format(name, determined))
+    for row in comparison.fastest(args.minimum, args.maximum):
+        print('Fastest for sizes {:g} - {:g}: {}'.format(*row))
+    if args.trace is not None:
+        options['observer'].save(args.trace)
+
+
+def run_materialize(argv):
+    """Command-line interface of materializing problems"""
+    parser = argparse.ArgumentParser(
+        prog='main.py materialize',
+        description='Saves every problem of a data structure once, later '
+                    'runs given the store directory instead of data load '
+                    'them. Numpy arrays are memory-mapped, other objects '
+                    'like lists are unpickled')
+    parser.add_argument(
+        'data',
+        help='Must contain a dictionary data_structure (size: problem)')
+    parser.add_argument(
+        'store',
+        help='Directory for the problems')
+
+    args = parser.parse_args(argv)
+    structure_module = importlib.import_module(args.data.replace('.py', ''))
+    problems = store.materialize(structure_module.data_structure, args.store)
+    print('Saved {} problems to {}'.format(len(problems), args.store))
+
+
+def run(argv=None):
     """Command-line interface function"""
+    if argv is None:
+        argv = sys.argv[1:]
+    if argv and argv[0] == 'batch':
+        return run_batch(argv[1:])
+    if argv and argv[0] == 'materialize':
+        return run_materialize(argv[1:])
+    if argv and argv[0] == 'compare':
+        return run_compare(argv[1:])
+
     # Parsing arguments
-    parser = argparse.ArgumentParser()
+    parser = argparse.ArgumentParser(
+        epilog='Use "main.py batch -h" for running many determinations, '
+               '"main.py compare -h" for comparing implementations, '
+               '"main.py materialize -h" for saving problems once')
 
     parser.add_argument(
         'data',
-        help='Must contain a dictionary data_structure (size: problem)')
+        help='Must contain a dictionary data_structure (size: problem), '
+             'or be a directory made by materialize')
     parser.add_argument(
         'test',
         help='Must contain a function tested_function, or a class with it')
     parser.add_argument(
         'clean',
         help='Must contain a function clean_function')
+    add_determination_arguments(parser)
     parser.add_argument(
-        '-t',
-        '--timeout',
+        '-j',
+        '--workers',
         type=int,
-        default=30,
-        help='Max execution time [s]')
+        help='Measures problems in a pool of that many processes')
+    parser.add_argument(
+        '--pin',
+        action='store_true',
+        help='Pins every worker process to a separate core')
+    parser.add_argument(
+        '--hard-kill',
+        action='store_true',
+        help='Measures every problem in its own process, killed after '
+             'the size timeout')
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
     logger.Logger.minimum_log_level = logger.LoggingLevel.WARN
+    options = determination_options(args)
     determined_complexity = complexity.determine_from_files(
         args.data,
         args.test,
         args.clean,
-        args.timeout)
+        args.timeout,
+        workers=args.workers,
+        pin_workers=args.pin,
+        hard_kill=args.hard_kill,
+        **options)
     print(determined_complexity)
+    if determined_complexity is not None and options['space'] is not None:
+        print('Memory: {}'.format(determined_complexity.space))
+    if args.trace is not None:
+        options['observer'].save(args.trace)
 
 
 # Loaded directly
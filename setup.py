@@ -33,6 +33,7 @@ setup(
                  'complexity_determinant'},
     include_package_data=True,
     install_requires=requirements,
+    python_requires='>=3.9',
     license="GNU General Public License v3",
     zip_safe=False,
     keywords='complexity_determinant',
@@ -42,9 +43,10 @@ setup(
         'License :: OSI Approved :: GNU General Public License v3 (GPLv3)',
         'Natural Language :: English',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.3',
-        'Programming Language :: Python :: 3.4',
-        'Programming Language :: Python :: 3.5',
+        'Programming Language :: Python :: 3.9',
+        'Programming Language :: Python :: 3.10',
+        'Programming Language :: Python :: 3.11',
+        'Programming Language :: Python :: 3.12',
     ],
     test_suite='tests',
     tests_require=test_requirements
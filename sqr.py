@@ -1,4 +1,5 @@
 from complexity_determinant import complexity
+from complexity_determinant.problems import LazyStructure
 
 if __name__ == "__main__":
     determined_complexity = complexity.determine_from_files(
@@ -10,11 +11,10 @@ if __name__ == "__main__":
     print(determined_complexity.max_problem_size_for_time(1000))
 
 
-data_structure = {
-}
-
-for i in range(40, 60):
-    data_structure[i] = list(range(1, i*100))
+# Problems are created one by one, just before they are measured
+data_structure = LazyStructure(
+    lambda i: list(range(1, i*100)),
+    range(40, 60))
 
 
 def clean_function():
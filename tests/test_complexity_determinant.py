@@ -8,6 +8,7 @@ test_complexity_determinant
 Tests for `complexity_determinant` module.
 """
 
+import numpy as np
 import pytest
 
 
@@ -28,3 +29,912 @@ def test_content(response):
     """
     # from bs4 import BeautifulSoup
     # assert 'GitHub' in BeautifulSoup(response.content).title.string
+
+
+def test_approximation_fits_linear_measurements():
+    from numpy import ones_like
+    from complexity_determinant.approximation import Approximation
+    measurements = [(x, 3 + 2*x) for x in range(1, 20)]
+    approximation = Approximation([ones_like, lambda x: x], measurements)
+    assert approximation.factors == pytest.approx([3, 2])
+    assert approximation(100) == pytest.approx(203)
+    assert approximation.mean_squared_error == pytest.approx(0, abs=1e-12)
+
+
+def test_approximation_is_array_native():
+    from numpy import array, ones_like
+    from complexity_determinant.approximation import Approximation
+    sizes = array([4e6, 4.5e6, 5e6, 5.5e6])
+    measurements = list(zip(sizes, 1e-3 + 1e-14*sizes*sizes))
+    approximation = Approximation([ones_like, lambda x: x*x], measurements)
+    assert approximation(sizes) == pytest.approx(1e-3 + 1e-14*sizes*sizes)
+    assert approximation(array([[1, 2]])).shape == (1, 2)
+
+
+@pytest.mark.parametrize('weighted', [False, True])
+def test_fitting_matches_standalone_approximations(weighted):
+    from complexity_determinant.approximation import Approximation
+    from complexity_determinant.complexity import (ComplexityLevel,
+                                                   relative_weights)
+    from complexity_determinant.fitting import Fitting
+    measurements = [(x, 0.5 + 1e-6*x*x + 1e-3*x) for x in range(10, 500, 7)]
+    weights = relative_weights(measurements) if weighted else None
+    bases = ComplexityLevel.bases()
+    fitting = Fitting(measurements, bases.values(), weights)
+    for base in bases.values():
+        shared = fitting.approximation(base)
+        alone = Approximation(base, measurements, weights=weights)
+        assert shared is fitting.approximation(base)
+        assert shared.factors == pytest.approx(alone.factors)
+        assert shared.mean_squared_error == \
+            pytest.approx(alone.mean_squared_error)
+        assert shared.leave_one_out_error == \
+            pytest.approx(alone.leave_one_out_error)
+
+
+def test_selection_evaluates_base_functions_once():
+    from complexity_determinant.complexity import (ComplexityLevel,
+                                                   best_complexity, constant)
+    measurements = [(x, 1 + 0.5*np.sqrt(x)) for x in range(10, 500, 7)]
+    evaluated = []
+
+    def square_root(x):
+        evaluated.append(np.size(x))
+        return np.sqrt(x)
+
+    ComplexityLevel.register('SQRTN', 'O(sqrt(n))', [constant, square_root])
+    try:
+        best_complexity(measurements)
+    finally:
+        ComplexityLevel.unregister('SQRTN')
+    # Besides the check of validity at the biggest size
+    assert evaluated.count(len(measurements)) == 1
+
+
+@pytest.mark.parametrize('level, sizes, time', [
+    ('O1', np.arange(40, 1000, 40), lambda x: 0.2 + 0*x),
+    ('LOGN', np.arange(40, 1000, 40), lambda x: 0.1 + 0.01*np.log(x)),
+    ('N', np.arange(40, 1000, 40), lambda x: 0.1 + 1e-4*x),
+    ('N2', np.arange(40, 1000, 40), lambda x: 0.1 + 1e-7*x*x),
+    ('N3', np.arange(40, 1000, 40), lambda x: 0.1 + 1e-10*x**3),
+    ('EXP', np.arange(1, 25), lambda x: 0.1 + 1e-6*2.0**x),
+])
+def test_best_complexity_recognizes_registered_classes(level, sizes, time):
+    from complexity_determinant.complexity import (ComplexityLevel,
+                                                   best_complexity)
+    chosen = best_complexity(list(zip(sizes, time(sizes))))
+    assert chosen.complexity_level is getattr(ComplexityLevel, level)
+
+
+def test_user_defined_complexity_class():
+    from complexity_determinant.complexity import (ComplexityLevel,
+                                                   best_complexity, constant)
+    level = ComplexityLevel.register(
+        'SQRTN', 'O(sqrt(n))', [constant, np.sqrt], np.square)
+    try:
+        sizes = np.arange(100, 10000, 100)*1.0
+        chosen = best_complexity(list(zip(sizes, 1 + 0.5*np.sqrt(sizes))))
+        assert chosen.complexity_level is level
+        assert chosen.max_problem_size_for_time(6) == pytest.approx(100)
+    finally:
+        ComplexityLevel.unregister('SQRTN')
+    assert level not in ComplexityLevel.registered()
+
+
+@pytest.mark.parametrize('level,time', [
+    ('LOGN', lambda n: 1 + 2*np.log(n)),
+    ('N', lambda n: 1 + 2*n),
+    ('N2', lambda n: 1 + 2*n*n),
+    ('NLOGN', lambda n: 1 + 2*n*np.log(n)),
+])
+def test_max_problem_size_for_times_inverts_execution_time(level, time):
+    from complexity_determinant.complexity import Complexity, ComplexityLevel
+    sizes = np.arange(10, 1000, 10)*1.0
+    chosen = Complexity(getattr(ComplexityLevel, level),
+                        list(zip(sizes, time(sizes))))
+    wanted = np.array([5.0, 50.0, 5000.0])
+    found = chosen.max_problem_size_for_time(time(wanted))
+    assert isinstance(found, np.ndarray)
+    assert found == pytest.approx(wanted)
+    # Shorter than the constant part
+    assert chosen.max_problem_size_for_time(-1) == 0
+    assert chosen.max_problem_size_for_time(0.5) == 0
+
+
+def test_max_problem_size_for_time_without_inverse_bisects():
+    from complexity_determinant.complexity import Complexity, ComplexityLevel
+    level = ComplexityLevel('SQRTN', 'O(sqrt(n))', [np.ones_like, np.sqrt])
+    sizes = np.arange(100, 10000, 100)*1.0
+    chosen = Complexity(level, list(zip(sizes, 1 + 0.5*np.sqrt(sizes))))
+    found = chosen.max_problem_size_for_time([0.5, 6, 51, 1e300])
+    assert found[:3] == pytest.approx([0, 100, 10000])
+    assert found[3] == np.inf
+
+
+def test_leave_one_out_error_matches_refitting():
+    from complexity_determinant.approximation import Approximation
+    from complexity_determinant.complexity import constant, linear
+    rng = np.random.default_rng(1)
+    sizes = np.arange(1, 20)*1.0
+    measurements = list(zip(sizes, 3 + 2*sizes + rng.normal(0, 1, 19)))
+    weights = 1/sizes
+    approximation = Approximation([constant, linear], measurements,
+                                  weights=weights)
+    errors = []
+    for i, (size, time) in enumerate(measurements):
+        others = measurements[:i] + measurements[i+1:]
+        refitted = Approximation([constant, linear], others,
+                                 weights=np.delete(weights, i))
+        errors.append(weights[i]*(time - refitted(size))**2)
+    assert approximation.leave_one_out_error == pytest.approx(np.mean(errors))
+
+
+def test_weighted_fitting_matches_approximation_and_updates():
+    from complexity_determinant.approximation import Approximation
+    from complexity_determinant.complexity import (ComplexityLevel,
+                                                   fit_complexities,
+                                                   relative_weights)
+    sizes = np.arange(10, 200, 10)*1.0
+    times = 1e-3*sizes*(1 + 0.1*np.sin(sizes))
+    measurements = list(zip(sizes, times))
+    weights = relative_weights(measurements)
+    for fitted in fit_complexities(measurements, weights):
+        base = fitted.complexity_level.base
+        if base[-1](sizes.max()) == np.inf:
+            continue
+        alone = Approximation(base, measurements, weights=weights)
+        assert fitted.approximation.factors == pytest.approx(alone.factors)
+        assert fitted.approximation.mean_squared_error == \
+            pytest.approx(alone.mean_squared_error)
+
+    level = ComplexityLevel.N
+    incremental = Approximation(level.base, measurements[:-1],
+                                weights=weights[:-1])
+    incremental.append(*measurements[-1], weight=weights[-1])
+    whole = Approximation(level.base, measurements, weights=weights)
+    assert incremental.factors == pytest.approx(whole.factors)
+    assert incremental.mean_squared_error == \
+        pytest.approx(whole.mean_squared_error)
+
+    fitted = [complexity for complexity
+              in fit_complexities(measurements[:-1], weights[:-1])
+              if complexity.complexity_level is level][0]
+    fitted.append(*measurements[-1], weight=weights[-1])
+    assert fitted.approximation.factors == pytest.approx(whole.factors)
+
+
+def test_criteria_penalize_overfitting():
+    from complexity_determinant.complexity import (ComplexityLevel,
+                                                   Criterion, constant,
+                                                   best_complexity, linear,
+                                                   quadratic, cubic)
+    level = ComplexityLevel.register(
+        'POLY3', 'O(poly3)', [constant, linear, cubic, quadratic])
+    try:
+        rng = np.random.default_rng(2)
+        sizes = np.arange(1, 9)*1.0
+        measurements = list(zip(sizes, 5 + sizes*sizes +
+                                rng.normal(0, 0.5, 8)))
+        assert best_complexity(measurements, Criterion.MSE).complexity_level \
+            is level
+        for criterion in (Criterion.LOO, Criterion.AIC, Criterion.BIC):
+            chosen = best_complexity(measurements, criterion)
+            assert chosen.complexity_level is ComplexityLevel.N2
+    finally:
+        ComplexityLevel.unregister('POLY3')
+
+
+def test_constant_complexity_has_no_modifier():
+    from complexity_determinant.complexity import (ComplexityLevel,
+                                                   best_complexity)
+    chosen = best_complexity([(size, 1e-6) for size in range(1, 20)])
+    assert chosen.complexity_level is ComplexityLevel.O1
+    assert str(chosen).startswith('Complexity O(1).')
+
+
+def test_two_measurements_are_ranked_without_leave_one_out():
+    from complexity_determinant.complexity import (ComplexityLevel,
+                                                   best_complexity)
+    chosen = best_complexity([(1, 1.0), (2, 2.0)])
+    assert chosen.complexity_level is not ComplexityLevel.O1
+    assert chosen.approximation.mean_squared_error == pytest.approx(0)
+
+
+@pytest.mark.parametrize('loss', ['huber', 'tukey'])
+def test_robust_fitting_resists_outliers(loss):
+    from complexity_determinant.complexity import (ComplexityLevel,
+                                                   best_complexity,
+                                                   relative_weights)
+    from complexity_determinant.robust import Loss
+    sizes = np.arange(10, 210, 10)*1.0
+    noise = 1 + 0.01*(-1)**np.arange(len(sizes))
+    times = (1e-3 + 1e-7*sizes*sizes)*noise
+    # A pause during the biggest problem
+    times[-1] *= 3
+    measurements = list(zip(sizes, times))
+    assert best_complexity(measurements).complexity_level is \
+        not ComplexityLevel.N2
+
+    # Relative residuals are comparable between sizes
+    chosen = best_complexity(measurements, weights=relative_weights(
+        measurements), loss=Loss(loss))
+    assert chosen.complexity_level is ComplexityLevel.N2
+    assert chosen.outliers == [measurements[-1]]
+    robust_weights = chosen.approximation.robust_weights
+    assert robust_weights[-1] < 0.5 and robust_weights[:-1].min() > 0.5
+    assert chosen.approximation.factors[1] == pytest.approx(1e-7, rel=0.05)
+
+
+def test_statistics_summarize_samples():
+    from complexity_determinant.sampling import Statistic
+    samples = [5, 1, 2, 3, 100, 2, 3, 2, 4, 3]
+    assert Statistic.MIN(samples) == 1
+    assert Statistic.MEDIAN(samples) == 3
+    assert Statistic.MEAN(samples) == 12.5
+    assert Statistic.TRIMMED_MEAN(samples) == 3
+
+
+def test_sampling_warms_up_and_repeats():
+    from complexity_determinant.sampling import Sampling
+    times = iter(range(100))
+    samples = Sampling(repeat=3, warmup=2).measure(lambda: next(times))
+    assert samples == [2, 3, 4]
+
+
+def test_adaptive_sampling_stops_when_precise_or_over_budget():
+    from complexity_determinant.sampling import Sampling
+    precise = Sampling(repeat=3, precision=0.01).measure(lambda: 0.1)
+    assert len(precise) == 3
+    times = iter([0.1, 0.3]*1000)
+    noisy = Sampling(repeat=3, precision=0.01, budget=2).measure(
+        lambda: next(times))
+    assert sum(noisy) >= 2 and sum(noisy[:-1]) < 2
+    times = iter([0.1, 0.3]*1000)
+    single = Sampling(precision=0.01, budget=2).measure(lambda: next(times))
+    assert len(single) > 1
+
+
+def test_determine_keeps_raw_samples():
+    from complexity_determinant.complexity import determine
+    from complexity_determinant.sampling import Sampling
+    structure = {size: list(range(size*1000)) for size in range(1, 6)}
+    chosen = determine(structure, sorted, lambda: None,
+                       sampling=Sampling(repeat=3, warmup=1))
+    assert sorted(chosen.samples) == list(structure)
+    assert all(len(times) == 3 for times in chosen.samples.values())
+
+
+def test_geometric_sizes():
+    from complexity_determinant.schedule import geometric_sizes
+    assert list(geometric_sizes(1, 20, 2)) == [1, 2, 4, 8, 16]
+    assert list(geometric_sizes(1, 4, 1.1)) == [1, 2, 3, 4]
+
+
+def test_determine_adaptive_stops_early(monkeypatch):
+    from complexity_determinant import complexity
+    from complexity_determinant.complexity import (ComplexityLevel,
+                                                   determine_adaptive)
+    created = []
+
+    def factory(size):
+        created.append(size)
+        return size
+
+    def measure(test, problem, sampling, size, samples, *limits):
+        """Deterministic linear timings instead of measuring"""
+        samples[size] = [0.1 + 1e-6*size]
+        return True
+
+    monkeypatch.setattr(complexity, 'measure_problem', measure)
+    chosen = determine_adaptive(factory, None, lambda: None, 100000, 10**12,
+                                max_execution=20)
+    assert created[-1] < 10**9
+    assert sorted(chosen.samples) == created
+    assert chosen.complexity_level is ComplexityLevel.N
+
+
+def test_determine_creates_lazy_problems_one_by_one():
+    import weakref
+    from complexity_determinant.complexity import determine
+    from complexity_determinant.problems import LazyStructure
+
+    class Problem(list):
+        pass
+
+    alive = []
+
+    def factory(size):
+        # Previous problem must be released before the next is created
+        assert all(reference() is None for reference in alive)
+        problem = Problem(range(size*1000))
+        alive.append(weakref.ref(problem))
+        return problem
+
+    structure = LazyStructure(factory, range(1, 6))
+    chosen = determine(structure, sorted, lambda: None)
+    assert sorted(chosen.samples) == list(range(1, 6))
+
+
+def test_determine_accepts_generators_and_memory_limit():
+    from complexity_determinant.complexity import determine
+    generated = ((size, list(range(size*1000))) for size in range(1, 6))
+    assert determine(generated, sorted, lambda: None, memory_limit=1) is None
+
+
+def sized_list(size):
+    return list(range(size*1000))
+
+
+@pytest.mark.parametrize('structure', [
+    {size: sized_list(size) for size in range(1, 9)},
+    'lazy',
+    'generator',
+])
+def test_determine_measures_in_worker_processes(structure):
+    from complexity_determinant.complexity import determine
+    from complexity_determinant.problems import LazyStructure
+    if structure == 'lazy':
+        structure = LazyStructure(sized_list, range(1, 9))
+    elif structure == 'generator':
+        structure = ((size, sized_list(size)) for size in range(1, 9))
+    chosen = determine(structure, sorted, lambda: None, workers=2,
+                       pin_workers=True)
+    assert sorted(chosen.samples) == list(range(1, 9))
+
+
+def test_workers_get_generated_problems_only_when_free():
+    import time
+    from complexity_determinant.complexity import determine
+    from complexity_determinant.sampling import Sampling
+    created = []
+
+    def generated():
+        for size in range(1, 7):
+            created.append(time.perf_counter())
+            yield size, 0.2
+
+    # Sleeping takes no CPU time, autoranging would loop it for long
+    determine(generated(), time.sleep, lambda: None, workers=2,
+              sampling=Sampling(min_time=None))
+    # Problems of 2 busy workers wait, the next ones aren't created yet
+    assert len(created) == 6
+    assert created[2] - created[0] > 0.15
+    assert created[4] - created[0] > 0.35
+
+
+def test_deadline_works_outside_of_main_thread():
+    import threading
+    from complexity_determinant.timeout import Deadline, TimeoutExceeded
+    outcome = []
+
+    def spin():
+        deadline = Deadline(0.1)
+        try:
+            with deadline:
+                while True:
+                    pass
+        except TimeoutExceeded as exceeded:
+            outcome.append(exceeded.deadline is deadline)
+
+    thread = threading.Thread(target=spin)
+    thread.start()
+    thread.join(5)
+    assert outcome == [True]
+
+
+def busy(size):
+    """Takes size hundredths of a second"""
+    import time
+    started = time.process_time()
+    while time.process_time() - started < size/100:
+        pass
+
+
+@pytest.mark.parametrize('hard_kill', [False, True])
+def test_size_timeout_skips_bigger_sizes(hard_kill):
+    from complexity_determinant.complexity import determine
+    structure = {size: size for size in [1, 2, 3, 30, 4, 40]}
+    chosen = determine(structure, busy, lambda: None, size_timeout=0.15,
+                       hard_kill=hard_kill)
+    assert sorted(chosen.samples) == [1, 2, 3, 4]
+
+
+def test_determine_async_runs_under_shared_limit():
+    import asyncio
+    from complexity_determinant.asynchronous import determine_async
+    running = []
+
+    def test(problem):
+        running.append(sum(1 for _ in range(problem)))
+
+    async def main():
+        limit = asyncio.Semaphore(2)
+        structure = {size: size*10000 for size in range(1, 6)}
+        return await asyncio.gather(*[
+            determine_async(structure, test, lambda: None, limit=limit)
+            for _ in range(4)])
+
+    results = asyncio.run(main())
+    assert [sorted(chosen.samples) for chosen in results] == \
+        [list(range(1, 6))]*4
+
+
+def test_cancelling_determine_async_stops_measuring():
+    import asyncio
+    import time
+    from complexity_determinant.asynchronous import determine_async
+    measured = []
+
+    def test(problem):
+        measured.append(problem)
+        busy(5)
+
+    async def main():
+        structure = {size: size for size in range(1000)}
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(
+                determine_async(structure, test, lambda: None), 0.3)
+
+    asyncio.run(main())
+    count = len(measured)
+    time.sleep(0.2)
+    assert count == len(measured) < 1000
+
+
+def test_cache_measures_only_missing_sizes(tmpdir):
+    from complexity_determinant.cache import MeasurementCache
+    from complexity_determinant.complexity import determine
+    from complexity_determinant.sampling import Sampling
+    cache = MeasurementCache(str(tmpdir.join('cache.sqlite')))
+    measured = []
+    # Every call measured alone, fast ones aren't repeated in a loop
+    single = Sampling(min_time=None)
+
+    def test(problem):
+        measured.append(problem)
+
+    determine({size: size for size in [1, 2, 3]}, test, lambda: None,
+              cache=cache, sampling=single)
+    chosen = determine({size: size for size in [1, 2, 3, 4]}, test,
+                       lambda: None, cache=cache, sampling=single)
+    assert measured == [1, 2, 3, 4]
+    assert sorted(chosen.samples) == [1, 2, 3, 4]
+
+    # Samples of another clock aren't reused
+    from complexity_determinant.timer import Clock
+    determine({size: size for size in [1, 2]}, test, lambda: None,
+              cache=cache,
+              sampling=Sampling(min_time=None, clock=Clock.PERF_COUNTER))
+    assert measured == [1, 2, 3, 4, 1, 2]
+
+
+def test_cache_keys_depend_on_code_and_evict_least_recently_used(tmpdir):
+    from complexity_determinant.cache import MeasurementCache, function_key
+
+    def first(x):
+        return x + 1
+
+    def second(x):
+        return x + 2
+
+    assert function_key(first) != function_key(second)
+    cache = MeasurementCache(str(tmpdir.join('cache.sqlite')), max_entries=2)
+    cache.update(first, {1: [0.1]})
+    cache.update(first, {2: [0.2]})
+    cache.get(first, 1)
+    cache.update(first, {3: [0.3]})
+    assert cache.get(first, 1) == [0.1]
+    assert cache.get(first, 2) is None
+    assert cache.get(second, 3) is None
+    # Sizes of numpy numbers are the same keys
+    assert cache.get(first, np.int64(1)) == [0.1]
+    cache.update(first, {(np.int64(4), np.float64(0.5)): [0.4]})
+    assert cache.get(first, (4, 0.5)) == [0.4]
+
+
+def test_cache_keys_are_stable_between_interpreters():
+    import os
+    import subprocess
+    import sys
+    script = ('from complexity_determinant.cache import function_key\n'
+              'def test(x):\n'
+              '    return x in {"alpha", "beta", "gamma", "delta"}\n'
+              'print(function_key(test))\n')
+    keys = set()
+    for seed in ('1', '2', '3'):
+        environment = dict(os.environ, PYTHONHASHSEED=seed)
+        keys.add(subprocess.check_output([sys.executable, '-c', script],
+                                         env=environment))
+    assert len(keys) == 1
+
+
+def test_approximation_updates_incrementally():
+    from complexity_determinant.approximation import Approximation
+    from complexity_determinant.complexity import constant, quadratic
+    rng = np.random.RandomState(0)
+    sizes = rng.uniform(1e6, 5e6, 50)
+    times = 0.01 + 2e-14*sizes*sizes + rng.normal(0, 1e-3, 50)
+    measurements = list(zip(sizes, times))
+    base = [constant, quadratic]
+    approximation = Approximation(base, measurements[:10])
+    for size, time in measurements[10:]:
+        approximation.append(size, time)
+    for size, time in measurements[:5]:
+        approximation.remove(size, time)
+    refitted = Approximation(base, measurements[5:])
+    assert approximation.factors == pytest.approx(refitted.factors)
+    assert approximation.mean_squared_error == \
+        pytest.approx(refitted.mean_squared_error)
+    assert len(approximation.sizes) == 45
+    assert sorted(approximation.measurements) == sorted(measurements[5:])
+    # Removed measurements can be added and removed again
+    approximation.append(*measurements[0])
+    approximation.remove(*measurements[0])
+    approximation.remove(*measurements[-1])
+    assert sorted(approximation.measurements) == sorted(measurements[5:-1])
+    with pytest.raises(ValueError):
+        approximation.remove(*measurements[0])
+
+
+@pytest.mark.parametrize('method, workers', [
+    ('tracemalloc', None),
+    ('rss', None),
+    ('rss', 2),
+])
+def test_determine_space_complexity(method, workers):
+    from complexity_determinant.complexity import ComplexityLevel, determine
+    from complexity_determinant.memory import MemoryMeasure
+    structure = {size: size*2**20 for size in range(1, 9)}
+    chosen = determine(structure, bytearray, lambda: None,
+                       space=MemoryMeasure(method), workers=workers)
+    assert chosen.space.complexity_level is ComplexityLevel.N
+    assert chosen.memory_usage(4) == pytest.approx(4*2**20, rel=0.2)
+    assert chosen.max_problem_size_for_memory(2**30) == \
+        pytest.approx(1024, rel=0.2)
+
+
+def test_benchmark_comparison_flags_regressions():
+    from benchmarks.bench import compare
+    from complexity_determinant.cache import fingerprint
+    stored = {'version': '0.1', 'fingerprint': fingerprint(),
+              'results': {'fast': 1.0, 'slow': 1.0}}
+    assert compare({'fast': 1.2, 'slow': 2.0, 'new': 5.0}, stored, 1.5) == \
+        ['slow']
+    # Timings of another machine aren't comparable
+    stored['fingerprint'] = 'another machine'
+    assert compare({'fast': 1.2, 'slow': 2.0}, stored, 1.5) == []
+
+
+@pytest.fixture
+def file_logger(tmpdir):
+    from complexity_determinant.logger import Logger, LoggingOutput
+    output, name = Logger.logging_output, Logger.logging_file
+    Logger.logging_output = LoggingOutput.FILE
+    Logger.logging_file = str(tmpdir.join('log.txt'))
+    yield Logger
+    Logger.stop_background()
+    Logger.close()
+    Logger.logging_output, Logger.logging_file = output, name
+
+
+@pytest.mark.parametrize('background', [False, True])
+def test_logger_writes_lines_to_file(file_logger, background):
+    from complexity_determinant.logger import LoggingLevel
+    if background:
+        file_logger.start_background()
+    for i in range(3):
+        file_logger.log('Message {}', LoggingLevel.ERR, i)
+    file_logger.flush()
+    with open(file_logger.logging_file) as log:
+        assert log.read() == 'Message 0\nMessage 1\nMessage 2\n'
+
+
+def failing(size):
+    if size == 3:
+        raise ValueError('boom at {}'.format(size))
+
+
+@pytest.mark.parametrize('options', [{'workers': 2}, {'hard_kill': True}])
+def test_logger_writes_lines_of_measuring_processes(file_logger, options):
+    from complexity_determinant.complexity import determine
+    from complexity_determinant.sampling import Sampling
+    determine({size: size for size in range(1, 5)}, failing, lambda: None,
+              sampling=Sampling(min_time=None), **options)
+    file_logger.flush()
+    with open(file_logger.logging_file) as log:
+        lines = log.read().splitlines()
+    assert 'boom at 3' in lines
+    assert 'Raised exception for size 3.' in lines
+
+
+def test_logger_formats_only_enabled_messages(file_logger):
+    from complexity_determinant.logger import LoggingLevel
+
+    class Expensive:
+        def __str__(self):
+            raise AssertionError('Formatted disabled message')
+
+    level = file_logger.minimum_log_level
+    file_logger.minimum_log_level = LoggingLevel.WARN
+    try:
+        file_logger.log('{}', LoggingLevel.DEBUG, Expensive())
+        assert not file_logger.enabled(LoggingLevel.DEBUG)
+    finally:
+        file_logger.minimum_log_level = level
+
+
+def test_batch_writes_json_record_per_manifest_line(tmpdir, monkeypatch):
+    import io
+    import json
+    from complexity_determinant.batch import read_manifest, run_batch
+    from complexity_determinant.complexity import ComplexityLevel
+    # Small problems keep the test independent of the machine's load
+    tmpdir.join('small_batch.py').write(
+        'data_structure = {size: list(range(size*100))\n'
+        '                  for size in range(1, 11)}\n'
+        'tested_function = sorted\n'
+        'def clean_function():\n'
+        '    pass\n')
+    monkeypatch.syspath_prepend(str(tmpdir))
+    manifest = ['# data test clean', '', 'small_batch small_batch '
+                'small_batch', 'missing small_batch small_batch']
+    jobs = list(read_manifest(manifest))
+    assert jobs == [('small_batch',)*3,
+                    ('missing', 'small_batch', 'small_batch')]
+    with pytest.raises(ValueError):
+        list(read_manifest(['lin lin']))
+
+    output = io.StringIO()
+    run_batch(jobs, output, timeout=30)
+    found, missing = [json.loads(line)
+                      for line in output.getvalue().splitlines()]
+    assert found['error'] is None and found['chosen']
+    assert len(found['candidates']) == len(ComplexityLevel.bases())
+    assert found['diagnostics']['sizes'] == len(found['measurements'])
+    assert missing['error'] and 'chosen' not in missing
+
+
+def test_batch_command_rejects_rss_with_jobs():
+    import os
+    import subprocess
+    import sys
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    finished = subprocess.run(
+        [sys.executable, 'main.py', 'batch', '-', '-j', '2', '--space',
+         'rss'], cwd=root, input='', stderr=subprocess.PIPE,
+        universal_newlines=True)
+    assert finished.returncode == 2
+    assert '--space rss is not supported with --jobs' in finished.stderr
+
+
+def test_command_line_starts_without_numeric_stack():
+    import os
+    import subprocess
+    import sys
+    script = (
+        'import sys, time\n'
+        'started = time.perf_counter()\n'
+        'import main\n'
+        'print(time.perf_counter() - started)\n'
+        'print(any(m in sys.modules for m in ("numpy", "scipy")))\n')
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run([sys.executable, '-c', script], cwd=root,
+                            stdout=subprocess.PIPE, check=True,
+                            universal_newlines=True).stdout.split()
+    # Generous for slow machines, importing scipy.optimize takes longer
+    assert float(output[0]) < 0.5
+    assert output[1] == 'False'
+
+
+def test_materialized_problems_are_memory_mapped(tmpdir):
+    from complexity_determinant.files_importer import properties_from_files
+    from complexity_determinant.store import ProblemStore, materialize
+    path = str(tmpdir.join('store'))
+    materialize({1: np.arange(10), 2: {'array': np.ones(100)},
+                 3: [1, 2, 3], (4, 5): 'tuple size',
+                 6: {'empty': np.array([])}}, path)
+    problems = ProblemStore(path)
+    assert problems.keys() == [1, 2, 3, (4, 5), 6]
+    assert len(problems[6]['empty']) == 0
+    assert isinstance(problems[1], np.memmap)
+    assert list(problems[1]) == list(range(10))
+    # Zero-copy buffers are read-only
+    assert not problems[2]['array'].flags.writeable
+    assert problems[2]['array'].sum() == 100
+    assert problems[3] == [1, 2, 3] and problems[(4, 5)] == 'tuple size'
+
+    structure, _, _ = properties_from_files(path, 'lin', 'lin')
+    assert isinstance(structure, ProblemStore)
+
+
+@pytest.mark.parametrize('workers', [None, 2])
+@pytest.mark.parametrize('generated', [False, True])
+def test_observer_receives_events_of_every_phase(workers, generated):
+    import io
+    import json
+    from complexity_determinant.complexity import determine
+    from complexity_determinant.events import ChromeTrace
+    from complexity_determinant.sampling import Sampling
+    trace = ChromeTrace()
+    sizes = (1000, 2000, 4000)
+    structure = {size: list(range(size)) for size in sizes}
+    if generated:
+        structure = ((size, list(range(size))) for size in sizes)
+    determine(structure, sorted, lambda: None, sampling=Sampling(repeat=3),
+              workers=workers, observer=trace)
+
+    phases = [event.phase for event in trace.events]
+    assert phases.count('setup') == phases.count('measure') == 3
+    assert phases[-3:] == ['clean', 'fit', 'determine']
+    whole = trace.events[-1]
+    for event in trace.events:
+        assert whole.start <= event.start <= event.end <= whole.end
+        if event.phase == 'measure':
+            assert event.size in sizes and event.repeat == 3
+
+    output = io.StringIO()
+    trace.write(output)
+    traced = json.loads(output.getvalue())['traceEvents']
+    assert {event['name'] for event in traced} >= {'measure 1000', 'fit'}
+
+
+def test_timer_records_wall_and_cpu_time_of_chosen_clock():
+    import threading
+    import time
+    from complexity_determinant.measurement import execute_function
+    from complexity_determinant.timer import Clock, Timer
+    for clock in Clock:
+        timer = Timer(clock)
+        timer.start()
+        time.sleep(0.05)
+        timer.stop()
+        assert timer.wall >= 0.04 and timer.cpu < 0.04
+        assert timer.time == (timer.cpu if clock.cpu else timer.wall)
+    # Calibrated overhead of the timer itself is subtracted
+    timer = Timer()
+    empty = []
+    for _ in range(100):
+        timer.start()
+        timer.stop()
+        empty.append(timer.wall_ns)
+    assert min(empty) < 100
+
+    # Thread time doesn't include other threads
+    other = threading.Thread(target=busy, args=(20,))
+    timer = Timer(Clock.THREAD_TIME)
+    timer.start()
+    other.start()
+    other.join()
+    timer.stop()
+    assert timer.time < timer.wall/2
+    assert execute_function(time.sleep, 0.05, Clock.PERF_COUNTER) >= 0.04
+
+
+def test_fast_calls_are_timed_in_calibrated_loops():
+    import gc
+    from complexity_determinant.complexity import determine
+    from complexity_determinant.measurement import autorange
+    from complexity_determinant.sampling import Sampling
+    calls = []
+
+    def fast(problem):
+        calls.append(gc.isenabled())
+
+    sampling = Sampling(repeat=3, min_time=0.01, disable_gc=True)
+    number, measured = autorange(fast, None, sampling)
+    assert number > 100 and measured == []
+    del calls[:]
+
+    chosen = determine({1: None, 2: None}, fast, lambda: None,
+                       sampling=sampling)
+    assert not any(calls) and gc.isenabled()
+    # Samples are times of one call
+    assert max(max(times) for times in chosen.samples.values()) < 1e-4
+    assert len(calls) >= 2*3*number
+    assert sorted(chosen.gc_pauses) == [1, 2]
+
+
+def test_garbage_collection_pauses_are_reported():
+    import gc
+    from complexity_determinant.complexity import determine
+    from complexity_determinant.sampling import Sampling
+
+    def collecting(size):
+        gc.collect()
+
+    chosen = determine({1: None, 2: None}, collecting, lambda: None,
+                       sampling=Sampling(min_time=None))
+    assert all(pause > 0 for pause in chosen.gc_pauses.values())
+
+
+def test_comparison_finds_crossovers_and_fastest_ranges():
+    from complexity_determinant.compare import Comparison, compare
+    from complexity_determinant.complexity import best_complexity
+    sizes = np.arange(10, 1001, 10)
+    linear = best_complexity([(n, 100 + 2*n) for n in sizes])
+    quadratic = best_complexity([(n, 1 + 0.01*n*n) for n in sizes])
+    comparison = Comparison({'linear': linear, 'quadratic': quadratic})
+    # 100 + 2n = 1 + n^2/100
+    crossing = (2 + np.sqrt(4 + 0.04*99))/0.02
+    assert comparison.crossovers('linear', 'quadratic') == \
+        pytest.approx([crossing], rel=1e-6)
+    ranges = comparison.fastest()
+    assert [name for _, _, name in ranges] == ['quadratic', 'linear']
+    assert ranges[0][0] == 10 and ranges[-1][1] == 1000
+    assert ranges[0][1] == pytest.approx(crossing, rel=1e-6)
+    assert 'Fastest for sizes' in str(comparison)
+
+    calls = []
+
+    def first(size):
+        calls.append('first')
+        busy(size)
+
+    def second(size):
+        calls.append('second')
+        busy(1)
+
+    from complexity_determinant.sampling import Sampling
+    compared = compare({size: size for size in [1, 2, 3, 4]},
+                       [first, second], lambda: None,
+                       sampling=Sampling(repeat=2, min_time=None))
+    assert set(compared.complexities) == {'first', 'second'}
+    # Runs of one problem alternate and rotate between tests
+    assert calls[:4] == ['first', 'second', 'second', 'first']
+    assert all(len(times) == 2 for times
+               in compared.complexities['first'].samples.values())
+
+
+@pytest.mark.parametrize('level, time', [
+    ('NM', lambda n, m: 1 + 0.01*n*m),
+    ('NPLUSM', lambda n, m: 1 + 0.02*n + 0.5*m),
+    ('NLOGM', lambda n, m: 2 + 0.1*n*np.log(m)),
+])
+def test_complexities_of_two_variables(level, time):
+    from complexity_determinant.complexity import (ComplexityLevel,
+                                                   best_complexity)
+    sizes = [(n, m) for n in [10, 20, 50, 100, 200] for m in [10, 30, 300]]
+    chosen = best_complexity([(size, time(*size)) for size in sizes])
+    assert chosen.complexity_level is getattr(ComplexityLevel, level)
+    assert chosen.execution_time((100, 30)) == pytest.approx(time(100, 30))
+    grid = np.array([[[10, 10], [20, 30]]])
+    assert chosen.execution_time(grid).shape == (1, 2)
+    # Along one axis with the other variable fixed
+    assert chosen.max_problem_size_for_time(
+        [time(50, 30), time(400, 30)], fixed=(None, 30)) == \
+        pytest.approx([50, 400])
+    assert chosen.max_problem_size_for_time(
+        time(50, 30), fixed=(50, None)) == pytest.approx(30)
+    with pytest.raises(ValueError):
+        chosen.max_problem_size_for_time(1, fixed=(None, None))
+
+
+def test_determine_tuple_sizes_skips_bigger_after_timeout():
+    from complexity_determinant.complexity import determine
+    from complexity_determinant.sampling import Sampling
+
+    def product(size):
+        busy(size[0]*size[1])
+
+    # Kept sizes take at most 0.04 s, far below the timeout even under load
+    structure = {size: size for size in
+                 [(1, 1), (1, 2), (2, 1), (10, 10), (20, 10), (1, 3),
+                  (2, 2)]}
+    chosen = determine(structure, product, lambda: None,
+                       sampling=Sampling(min_time=None), size_timeout=0.5)
+    assert sorted(chosen.samples) == [(1, 1), (1, 2), (1, 3), (2, 1), (2, 2)]
+    assert chosen.complexity_level.variables == 2
+
+
+def test_adaptive_budget_counts_every_call_of_loops():
+    from time import perf_counter
+    from complexity_determinant.measurement import measure_problem
+    from complexity_determinant.sampling import Sampling
+    sampling = Sampling(repeat=5, precision=1e-9, budget=0.2,
+                        max_repeat=10**6)
+    samples = {}
+    started = perf_counter()
+    assert measure_problem(lambda problem: None, None, sampling, 1, samples,
+                           size_timeout=10)
+    assert perf_counter() - started < 2
+    assert 5 <= len(samples[1]) < 10**6